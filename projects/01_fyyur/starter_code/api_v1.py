@@ -0,0 +1,183 @@
+import hashlib
+from datetime import datetime
+
+from flask import Blueprint, abort, jsonify, request
+from sqlalchemy.orm import contains_eager
+
+from models import Venue, Artist, Show
+from pagination import paginate_request, page_url
+from queries import venues_with_show_counts, artists_with_show_counts, genre_names_by_owner
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+VENUE_FIELDS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+                'facebook_link', 'website_link', 'seeking_talent', 'seeking_description',
+                'upcoming_shows_count', 'past_shows_count')
+ARTIST_FIELDS = ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+                 'facebook_link', 'website_link', 'seeking_venue', 'seeking_description',
+                 'upcoming_shows_count', 'past_shows_count')
+SHOW_FIELDS = ('start_time', 'artist_id', 'artist_name', 'venue_id', 'venue_name')
+
+
+# ----------------------------------------------------------------------------#
+# Helpers.
+# ----------------------------------------------------------------------------#
+
+def requested_fields(allowed):
+    """Sparse fieldset from ``?fields=a,b``; every field when absent."""
+    fields = request.args.get('fields')
+    if not fields:
+        return allowed
+    fields = tuple(field for field in fields.split(',') if field)
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        abort(400, description=f'unknown fields: {", ".join(sorted(unknown))}')
+    return fields
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional(etag, build):
+    """304 when the client holds ``etag``; otherwise serialize ``build()``.
+
+    The ETag comes from row ids, versions and show counts only, so a
+    matching poll skips serialization entirely.
+    """
+    if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+        response = jsonify()
+        response.status_code = 304
+        response.set_data(b'')
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def owner_json(entity, upcoming_shows_count, past_shows_count, genres, fields):
+    computed = {
+        'genres': genres,
+        'upcoming_shows_count': upcoming_shows_count,
+        'past_shows_count': past_shows_count,
+    }
+    data = {'id': entity.id}
+    for field in fields:
+        data[field] = computed[field] if field in computed else _plain(getattr(entity, field))
+    return data
+
+
+def show_json(show, fields):
+    data = {'id': show.id}
+    for field in fields:
+        data[field] = _plain(getattr(show, field))
+    return data
+
+
+def collection_json(page, data):
+    links = {}
+    if page.next_cursor:
+        links['next'] = page_url(after=page.next_cursor)
+    if page.prev_cursor:
+        links['prev'] = page_url(before=page.prev_cursor)
+    return {'data': data, 'links': links}
+
+
+# ----------------------------------------------------------------------------#
+# Venues and artists.
+# ----------------------------------------------------------------------------#
+
+def _owner_collection(model, query, allowed):
+    fields = requested_fields(allowed)
+    page = paginate_request(query, (model.name, model.id),
+                            lambda row: (row[0].name, row[0].id))
+    etag = make_etag(model.__tablename__, fields, page.next_cursor, page.prev_cursor,
+                     [(entity.id, entity.version_id, upcoming, past) for entity, upcoming, past in page])
+
+    def build():
+        genres = genre_names_by_owner(model, [row[0].id for row in page]) if 'genres' in fields else {}
+        return collection_json(page, [owner_json(entity, upcoming, past, genres.get(entity.id), fields)
+                                      for entity, upcoming, past in page])
+    return conditional(etag, build)
+
+
+def _owner_resource(model, query, entity_id, allowed):
+    fields = requested_fields(allowed)
+    row = query.filter(model.id == entity_id).one_or_none()
+    if row is None:
+        abort(404)
+    entity, upcoming, past = row
+    etag = make_etag(model.__tablename__, fields, entity.id, entity.version_id, upcoming, past)
+
+    def build():
+        genres = genre_names_by_owner(model, [entity.id])[entity.id] if 'genres' in fields else None
+        return {'data': owner_json(entity, upcoming, past, genres, fields)}
+    return conditional(etag, build)
+
+
+@api_v1.route('/venues')
+def venues():
+    return _owner_collection(Venue, venues_with_show_counts(), VENUE_FIELDS)
+
+
+@api_v1.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _owner_resource(Venue, venues_with_show_counts(), venue_id, VENUE_FIELDS)
+
+
+@api_v1.route('/artists')
+def artists():
+    return _owner_collection(Artist, artists_with_show_counts(), ARTIST_FIELDS)
+
+
+@api_v1.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _owner_resource(Artist, artists_with_show_counts(), artist_id, ARTIST_FIELDS)
+
+
+# ----------------------------------------------------------------------------#
+# Shows.
+# ----------------------------------------------------------------------------#
+
+def _shows_query():
+    return Show.query.join(Show.artist).join(Show.venue) \
+        .options(contains_eager(Show.artist), contains_eager(Show.venue))
+
+
+def _show_version(show):
+    # artist and venue names are embedded, so their versions count too
+    return show.id, show.version_id, show.artist.version_id, show.venue.version_id
+
+
+@api_v1.route('/shows')
+def shows():
+    fields = requested_fields(SHOW_FIELDS)
+    page = paginate_request(_shows_query(), (Show.start_time, Show.id),
+                            lambda show: (show.start_time, show.id))
+    etag = make_etag('Show', fields, page.next_cursor, page.prev_cursor,
+                     [_show_version(show) for show in page])
+    return conditional(etag, lambda: collection_json(page, [show_json(show, fields) for show in page]))
+
+
+@api_v1.route('/shows/<int:show_id>')
+def show(show_id):
+    fields = requested_fields(SHOW_FIELDS)
+    show = _shows_query().filter(Show.id == show_id).one_or_none()
+    if show is None:
+        abort(404)
+    etag = make_etag('Show', fields, _show_version(show))
+    return conditional(etag, lambda: {'data': show_json(show, fields)})
+
+
+# ----------------------------------------------------------------------------#
+# Errors.
+# ----------------------------------------------------------------------------#
+
+@api_v1.errorhandler(400)
+@api_v1.errorhandler(404)
+def api_error(error):
+    return jsonify({'error': error.code, 'message': error.description}), error.code
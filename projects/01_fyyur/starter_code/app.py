@@ -2,34 +2,47 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import dateutil.parser
-import babel
-from flask import render_template, request, flash, redirect, url_for, abort, jsonify
-from sqlalchemy import cast, Date
+from datetime import date, datetime, time, timedelta
+
+from flask import render_template, request, flash, redirect, url_for, abort, jsonify, Response, stream_with_context
+from sqlalchemy.orm import contains_eager
 import logging
 from logging import Formatter, FileHandler
-from forms import *
 
-from config import app, db
+from config import create_app, db, response_cache
 # import models
-from models import Venue, Artist, Show
+from models import Venue, Artist, Show, Area
+from queries import (venues_with_show_counts, next_show_start, shows_between, venues_matching, artists_matching,
+                     load_venue_detail, load_artist_detail, venue_suggestions, artist_suggestions, venues_near)
+from pagination import paginate_request, page_url, KeysetPage
+from importer import import_command
+from exporter import export, export_command, EXPORTS, FORMATS
+from formatting import format_datetime, parse_datetime
+from api_v1 import api_v1
+from bookings import BookingConflict, book, free_slots
+from areas import current_areas, refresh_areas_command
+from calendars import calendar_response, touch_feeds
+from startup import startup_report_command
+from geocoding import geocode_venues_command
+# forms are imported inside the views that use them: wtforms loads with the first form
+
+app = create_app()
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
+app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.globals['page_url'] = page_url
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(refresh_areas_command)
+app.cli.add_command(startup_report_command)
+app.cli.add_command(geocode_venues_command)
 
-
-app.jinja_env.filters['datetime'] = format_datetime
+app.register_blueprint(api_v1)
 
 
 # ----------------------------------------------------------------------------#
@@ -45,26 +58,53 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@response_cache.cached('venues')
 def venues():
-    venues_sorted_by_area = Venue.query.order_by(Venue.state).all()
+    genre = request.args.get('genre')
+    if genre:
+        return venue_listing(venues_with_show_counts().filter(Venue.genres.any(name=genre)), genre=genre)
+
+    # one read of the materialized summary, however many venues there are
+    page = paginate_request(Area.query, (Area.state, Area.city),
+                            lambda area: (area.state, area.city))
+    data = current_areas(page.items)
+
+    response_cache.expire_at(min((area['next_show_start'] for area in data if area['next_show_start']), default=None))
+    return render_template('pages/venues.html', areas=data, page=page)
+
+
+@app.route('/venues/areas/<state>/<city>')
+@response_cache.cached('venues')
+def area_venues(state, city):
+    query = venues_with_show_counts().filter(Venue.state == state, Venue.city == city)
+    return venue_listing(query, state=state, city=city)
+
+
+def venue_listing(query, **context):
+    """Venues of ``query`` grouped under their area, a page at a time."""
+    # the area leads the key so that one is never split out of order across pages
+    page = paginate_request(query,
+                            (Venue.state, Venue.city, Venue.name, Venue.id),
+                            lambda row: (row[0].state, row[0].city, row[0].name, row[0].id))
 
     data = []
-    state = None
-    for venue in venues_sorted_by_area:
-        if venue.state != state:
+    area = None
+    for venue, upcoming_shows_count, _ in page:
+        if (venue.state, venue.city) != area:
             data.append({
                 "city": venue.city,
                 "state": venue.state,
                 "venues": []
             })
-            state = venue.state
+            area = (venue.state, venue.city)
         data[-1]["venues"].append({
             "id": venue.id,
             "name": venue.name,
-            "num_upcoming_shows": venue.upcoming_shows_count
+            "num_upcoming_shows": upcoming_shows_count
         })
 
-    return render_template('pages/venues.html', areas=data)
+    response_cache.expire_at(next_show_start())
+    return render_template('pages/venues.html', areas=data, page=page, **context)
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -72,33 +112,101 @@ def search_venues():
     # search for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
     term = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{term}%')).all()
-
-    def count_upcoming_shows(_shows):
-        return len(list(filter(lambda show: show.start_time >= datetime.today(), _shows)))
+    venues = venues_matching(term)
 
     response = {
         'count': len(venues),
-        'data': [{'id': venue.id, 'name': venue.name, 'num_upcoming_shows': count_upcoming_shows(venue.shows)}
-                 for venue in venues]
+        'data': [{'id': venue.id, 'name': venue.name, 'num_upcoming_shows': upcoming_shows_count}
+                 for venue, upcoming_shows_count, _ in venues]
     }
 
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
+# Largest radius /venues/nearby accepts, in miles.
+MAX_NEARBY_MILES = 250
+
+
+@app.route('/venues/nearby')
+def nearby_venues():
+    # venues within "radius" miles (default 10) of "lat", "lon", nearest first
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get('radius', 10.0, type=float)
+    context = {'latitude': latitude, 'longitude': longitude, 'radius': radius, 'max_radius': MAX_NEARBY_MILES}
+    if latitude is None and longitude is None:
+        return render_template('pages/nearby_venues.html', results=None, **context)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180 \
+            or not 0 < radius <= MAX_NEARBY_MILES:
+        abort(400)
+
+    venues = venues_near(latitude, longitude, radius)
+    response = {
+        'count': len(venues),
+        'data': [{'id': venue.id, 'name': venue.name, 'city': venue.city, 'state': venue.state,
+                  'miles': miles, 'num_upcoming_shows': upcoming_shows_count}
+                 for venue, upcoming_shows_count, _, miles in venues]
+    }
+    return render_template('pages/nearby_venues.html', results=response, **context)
+
+
+@app.route('/venues/suggest')
+def suggest_venues():
+    return suggestions(venue_suggestions)
+
+
+def suggestions(suggest):
+    """``[{"id", "name"}]`` completing ``?q=``, at most ``?limit=`` (10, up to 25)."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 25)
+    return jsonify([{'id': id, 'name': name}
+                    for id, name in suggest(request.args.get('q', ''), limit)])
+
+
 @app.route('/venues/<int:venue_id>')
+@response_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.filter_by(id=venue_id).one()
+    venue = load_venue_detail(venue_id)
+    if not venue:
+        abort(404)
+    response_cache.tag(*{f'artist:{show.artist_id}' for show in venue.shows})
+    response_cache.expire_at(venue.next_rollover)
     return render_template('pages/show_venue.html', venue=venue)
 
 
+@app.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+    return calendar_response('venue', venue_id)
+
+
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+    # free slots between "from" (default today) and "to" (inclusive, default a week on)
+    Venue.query.get_or_404(venue_id)
+    try:
+        start = datetime.combine(parse_datetime(request.args['from']).date()
+                                 if request.args.get('from') else date.today(), time.min)
+        end = datetime.combine(parse_datetime(request.args['to']).date() + timedelta(days=1), time.min) \
+            if request.args.get('to') else start + timedelta(days=7)
+    except (ValueError, OverflowError):
+        abort(400)
+
+    return jsonify({
+        'venue_id': venue_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'free': [{'start': slot_start.isoformat(), 'end': slot_end.isoformat()}
+                 for slot_start, slot_end in free_slots(venue_id, start, end)],
+    })
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
@@ -106,6 +214,7 @@ def create_venue_form():
 @app.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     error = False
+    from forms import VenueForm
     form = VenueForm()
     if not form.validate_on_submit():
         message = []
@@ -120,6 +229,7 @@ def create_venue_submission():
         form.feedback_to(venue)
         db.session.add(venue)
         db.session.commit()
+        response_cache.invalidate('venues')
     except BaseException as e:
         db.session.rollback()
         error = True
@@ -139,13 +249,13 @@ def create_venue_submission():
 def delete_venue(venue_id):
     result = False
     try:
-        venue = Venue.query.filter_by(id=venue_id).one()
-        db.session.delete(venue)
-        Show.query.filter_by(venue_id=venue_id).delete()
+        touch_feeds('venue', [venue_id])
+        # one DELETE; the database cascades to shows and genre links
+        result = Venue.query.filter_by(id=venue_id).delete(synchronize_session=False) > 0
         db.session.commit()
-        result = True
-    except Exception as e:
-        print(e.args)
+        response_cache.invalidate('venues', 'artists', f'venue:{venue_id}', 'shows')
+    except Exception:
+        app.logger.exception('could not delete venue %s', venue_id)
         db.session.rollback()
     finally:
         db.session.close()
@@ -155,12 +265,44 @@ def delete_venue(venue_id):
     })
 
 
+def bulk_delete(model, kind):
+    """Delete the ``{"ids": [...]}`` of the request body in one transaction."""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if not isinstance(ids, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+        abort(400)
+    try:
+        touch_feeds(kind, ids)
+        deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        app.logger.exception('could not delete %ss %s', kind, ids)
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    response_cache.invalidate('venues', 'artists', 'shows', *(f'{kind}:{id}' for id in ids))
+    return {'delete': True, 'deleted': deleted}
+
+
+@app.route('/venues', methods=['DELETE'])
+def delete_venues():
+    return jsonify(bulk_delete(Venue, 'venue'))
+
+
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@response_cache.cached('artists')
 def artists():
-    artists= Artist.query.all()
-    return render_template('pages/artists.html', artists=artists)
+    query = Artist.query
+    genre = request.args.get('genre')
+    if genre:
+        query = query.filter(Artist.genres.any(name=genre))
+
+    page = paginate_request(query, (Artist.name, Artist.id),
+                            lambda artist: (artist.name, artist.id))
+    return render_template('pages/artists.html', artists=page.items, page=page, genre=genre)
 
 
 @app.route('/artists/search', methods=['POST'])
@@ -168,32 +310,51 @@ def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
     term = request.form.get('search_term', '')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{term}%')).all()
+    artists = artists_matching(term)
     response = {
         "count": len(artists),
         "data": [{
             "id": artist.id,
             "name": artist.name,
-            "num_upcoming_shows": artist.upcoming_shows_count,
-        } for artist in artists]
+            "num_upcoming_shows": upcoming_shows_count,
+        } for artist, upcoming_shows_count, _ in artists]
     }
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/artists/suggest')
+def suggest_artists():
+    return suggestions(artist_suggestions)
+
+
 @app.route('/artists/<int:artist_id>')
+@response_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    artist = Artist.query.filter_by(id=artist_id).first()
+    artist = load_artist_detail(artist_id)
     if not artist:
         abort(404)
+    response_cache.tag(*{f'venue:{show.venue_id}' for show in artist.shows})
+    response_cache.expire_at(artist.next_rollover)
     return render_template('pages/show_artist.html', artist=artist)
 
 
+@app.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+    return calendar_response('artist', artist_id)
+
+
+@app.route('/artists', methods=['DELETE'])
+def delete_artists():
+    return jsonify(bulk_delete(Artist, 'artist'))
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
     artist = Artist.query.filter_by(id=artist_id).first()
     if not artist:
@@ -206,6 +367,7 @@ def edit_artist(artist_id):
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
+    from forms import ArtistForm
     form = ArtistForm()
     artist = Artist.query.filter_by(id=artist_id).first()
 
@@ -220,6 +382,7 @@ def edit_artist_submission(artist_id):
 
     try:
         db.session.commit()
+        response_cache.invalidate('artists', f'artist:{artist_id}', 'shows')
     except BaseException as e:
         db.session.rollback()
         abort(500)
@@ -231,6 +394,7 @@ def edit_artist_submission(artist_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
+    from forms import VenueForm
     form = VenueForm()
     venue = Venue.query.filter_by(id=venue_id).first()
 
@@ -244,6 +408,7 @@ def edit_venue(venue_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
+    from forms import VenueForm
     form = VenueForm()
     venue = Venue.query.filter_by(id=venue_id).first()
 
@@ -260,6 +425,7 @@ def edit_venue_submission(venue_id):
     form.feedback_to(venue)
     try:
         db.session.commit()
+        response_cache.invalidate('venues', f'venue:{venue_id}', 'shows')
     except BaseException as e:
         db.session.rollback()
         abort(500)
@@ -274,6 +440,7 @@ def edit_venue_submission(venue_id):
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
@@ -281,6 +448,7 @@ def create_artist_form():
 @app.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     error = False
+    from forms import ArtistForm
     form = ArtistForm()
 
     if not form.validate_on_submit():
@@ -295,6 +463,7 @@ def create_artist_submission():
     try:
         db.session.add(artist)
         db.session.commit()
+        response_cache.invalidate('artists')
     except BaseException as e:
         db.session.rollback()
         error = True
@@ -313,23 +482,30 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@response_cache.cached('shows')
 def shows():
     # displays list of shows at /shows
-    _shows = Show.query.all()
+    _shows = paginate_request(Show.query.join(Show.artist).join(Show.venue)
+                              .options(contains_eager(Show.artist), contains_eager(Show.venue)),
+                              (Show.start_time, Show.id),
+                              lambda show: (show.start_time, show.id))
     show_data = [{
+        "id": show.id,
+        "versions": (show.version_id, show.artist.version_id, show.venue.version_id),
         "venue_id": show.venue.id,
         "venue_name": show.venue.name,
         "artist_id": show.artist_id,
         "artist_name": show.artist.name,
         "artist_image_link": show.artist.image_link,
-        "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')} for show in _shows]
+        "start_time": show.start_time} for show in _shows]
 
-    return render_template('pages/shows.html', shows=show_data)
+    return render_template('pages/shows.html', shows=show_data, page=_shows)
 
 
 @app.route('/shows/create', methods=['GET'])
 def create_shows():
     # renders form. do not touch.
+    from forms import ShowForm
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
@@ -337,16 +513,21 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
+    conflict = None
+    from forms import ShowForm
     form = ShowForm()
 
     if form.validate_on_submit():
-        show = Show(artist_id=form.artist_id.data,
-                    venue_id=form.venue_id.data,
-                    start_time=form.start_time.data)
-
         try:
-            db.session.add(show)
-            db.session.commit()
+            show = Show(artist_id=int(form.artist_id.data),
+                        venue_id=int(form.venue_id.data),
+                        start_time=form.start_time.data,
+                        duration_minutes=form.duration_minutes.data)
+            book(show)
+            response_cache.invalidate('shows', 'venues',
+                                      f'venue:{form.venue_id.data}', f'artist:{form.artist_id.data}')
+        except BookingConflict as e:
+            conflict = e
         except BaseException as e:
             db.session.rollback()
             error = True
@@ -356,7 +537,9 @@ def create_show_submission():
         error = True
 
     # on successful db insert, flash success
-    if error:
+    if conflict:
+        flash(f'Show could not be listed. {conflict}')
+    elif error:
         flash('An error occurred. Show could not be listed.')
     else:
         flash('Show was successfully listed!')
@@ -365,30 +548,59 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/shows/search', methods=['POST'])
+@app.route('/shows/search', methods=['GET', 'POST'])
 def search_shows():
-    term = request.form.get('search_term', '')
-    if not term:
-        term = datetime.now()
+    # search_term is the first day of the range; "to" optionally closes it (inclusive).
+    # The pager's links repeat a POSTed search as GET.
+    term = request.values.get('search_term', '')
+    to = request.values.get('to', '')
     try:
-        shows = db.session.query(Show).join(Artist).join(Venue).\
-            filter(cast(Show.start_time, Date) >= cast(term, Date)).all()
-    except:
+        start = datetime.combine(parse_datetime(term).date() if term else date.today(), time.min)
+        end = datetime.combine(parse_datetime(to).date() + timedelta(days=1), time.min) if to else None
+    except (ValueError, OverflowError):
         # invalid date format
-        shows = []
+        page = KeysetPage([])
+    else:
+        page = paginate_request(shows_between(start, end,
+                                              venue_id=request.values.get('venue_id', type=int),
+                                              artist_id=request.values.get('artist_id', type=int)).order_by(None),
+                                (Show.start_time, Show.id),
+                                lambda show: (show.start_time, show.id))
 
     response = {
-        'count': len(shows),
+        'count': len(page.items),
         'data': [{'id': show.id,
                   'show': show,
                   'artist': show.artist,
                   'venue': show.venue,
-                  'start_time': str(show.start_time),
-                  } for show in shows]
+                  'start_time': show.start_time,
+                  } for show in page]
     }
 
-    return render_template('pages/show.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+    return render_template('pages/show.html', results=response, page=page,
+                           search_term=term, to=to,
+                           venue_id=request.values.get('venue_id', ''),
+                           artist_id=request.values.get('artist_id', ''))
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<kind>.<fmt>')
+def export_rows(kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    since = request.args.get('since')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+        # venues and artists have no time to filter ``since`` on
+        chunks = export(kind, fmt, since=since, since_id=request.args.get('since_id', type=int))
+    except ValueError:
+        abort(400)
+
+    return Response(stream_with_context(chunks), mimetype=FORMATS[fmt][1],
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,191 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import distinct, event, func, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from config import db
+from models import Area, Venue, Show
+
+_PENDING = 'areas_pending'
+_ALL = object()
+
+# Dialects whose INSERT takes ON CONFLICT ... DO UPDATE.
+_UPSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+_SUMMARY_COLUMNS = ('venue_count', 'upcoming_shows_count', 'next_show_start')
+
+
+# ----------------------------------------------------------------------------#
+# Refresh.
+#
+# The Area table is a materialized summary of venues per (state, city).
+# Every session that writes venues or shows recomputes the rows of just the
+# areas it touched, in the same transaction, right before it commits. Rows
+# are upserted rather than deleted and inserted again, so two transactions
+# writing the same city never collide on its primary key.
+# ----------------------------------------------------------------------------#
+
+def _in_areas(keys):
+    return tuple_(Venue.state, Venue.city).in_(list(keys))
+
+
+def _lock_areas(upsert, keys):
+    """Create or lock the Area rows of ``keys`` until the transaction ends.
+
+    A concurrent writer of the same area makes this wait for its commit, so
+    the summary counted next includes its venues and shows. Keys are locked
+    in sorted order so two writers cannot deadlock.
+    """
+    statement = upsert(Area.__table__).values([
+        {'state': state, 'city': city, 'venue_count': 0, 'upcoming_shows_count': 0}
+        for state, city in sorted(keys)
+    ])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['state', 'city'], set_={'venue_count': Area.__table__.c.venue_count}))
+
+
+def refresh_areas(keys=None, now=None):
+    """Recompute the Area rows of ``keys``, or of every area when None."""
+    if now is None:
+        now = datetime.today()
+    upsert = _UPSERTS[db.session.connection().dialect.name]
+    upcoming = Show.start_time >= now
+    summary = db.session.query(Venue.state, Venue.city,
+                               func.count(distinct(Venue.id)),
+                               func.count(Show.id).filter(upcoming),
+                               func.min(Show.start_time).filter(upcoming)) \
+        .outerjoin(Show, Show.venue_id == Venue.id) \
+        .filter(Venue.state.isnot(None), Venue.city.isnot(None)) \
+        .group_by(Venue.state, Venue.city)
+    # areas left without venues
+    emptied = Area.__table__.delete().where(~db.session.query(Venue.id).filter(
+        Venue.state == Area.state, Venue.city == Area.city).exists())
+
+    if keys is not None:
+        keys = set(keys)
+        if not keys:
+            return
+        _lock_areas(upsert, keys)
+        summary = summary.filter(_in_areas(keys))
+        emptied = emptied.where(tuple_(Area.state, Area.city).in_(list(keys)))
+
+    statement = upsert(Area.__table__).from_select(['state', 'city', *_SUMMARY_COLUMNS], summary)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['state', 'city'],
+        set_={column: statement.excluded[column] for column in _SUMMARY_COLUMNS}))
+    db.session.execute(emptied)
+
+
+def refresh_on_commit(session, keys=None):
+    """Refresh ``keys`` (every area when None) when ``session`` commits."""
+    pending = session.info.setdefault(_PENDING, set())
+    if keys is None:
+        pending.add(_ALL)
+    else:
+        pending.update(keys)
+
+
+def _venue_keys(venue):
+    """The venue's area, and the one it left when its state or city changed."""
+    old = []
+    for attribute in ('state', 'city'):
+        history = get_history(venue, attribute)
+        old.append(history.deleted[0] if history.deleted else getattr(venue, attribute))
+    return {(venue.state, venue.city), tuple(old)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    keys = set()
+    venue_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Venue):
+            keys |= _venue_keys(obj)
+        elif isinstance(obj, Show):
+            venue_ids.add(obj.venue_id)
+    if venue_ids:
+        keys |= set(session.query(Venue.state, Venue.city).filter(Venue.id.in_(venue_ids)))
+    if keys:
+        refresh_on_commit(session, {key for key in keys if None not in key})
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+@event.listens_for(Session, 'after_bulk_update')
+def _collect_bulk_change(context):
+    if context.mapper.class_ in (Venue, Show):
+        refresh_on_commit(context.session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_pending(session):
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        refresh_areas(None if _ALL in pending else pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
+
+
+# ----------------------------------------------------------------------------#
+# Reading.
+# ----------------------------------------------------------------------------#
+
+def _upcoming_by_area(keys, now):
+    """``{(state, city): (upcoming show count, next show start)}`` counted live."""
+    upcoming = dict.fromkeys(keys, (0, None))
+    if upcoming:
+        rows = db.session.query(Venue.state, Venue.city, func.count(Show.id), func.min(Show.start_time)) \
+            .join(Show, Show.venue_id == Venue.id) \
+            .filter(_in_areas(upcoming), Show.start_time >= now) \
+            .group_by(Venue.state, Venue.city)
+        upcoming.update({(state, city): (count, start) for state, city, count, start in rows})
+    return upcoming
+
+
+def current_areas(areas, now=None):
+    """``areas`` as dicts, recounting those whose next show has started.
+
+    Counts in the table only go stale as time passes a show's start; those
+    rows are recounted here without writing, so read-only requests can
+    still be served from a replica. ``flask refresh-areas`` persists them.
+    """
+    if now is None:
+        now = datetime.today()
+    stale = [(area.state, area.city) for area in areas
+             if area.next_show_start is not None and area.next_show_start < now]
+    upcoming = _upcoming_by_area(stale, now)
+    current = []
+    for area in areas:
+        count, next_show_start = upcoming.get((area.state, area.city),
+                                              (area.upcoming_shows_count, area.next_show_start))
+        current.append({
+            'state': area.state,
+            'city': area.city,
+            'venue_count': area.venue_count,
+            'upcoming_shows_count': count,
+            'next_show_start': next_show_start,
+        })
+    return current
+
+
+# ----------------------------------------------------------------------------#
+# Command.
+# ----------------------------------------------------------------------------#
+
+@click.command('refresh-areas')
+@with_appcontext
+def refresh_areas_command():
+    """Rebuild the area summary behind the venues page."""
+    refresh_areas()
+    db.session.commit()
+    click.echo(f'{Area.query.count()} areas', err=True)
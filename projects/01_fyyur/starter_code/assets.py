@@ -0,0 +1,193 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    # optional: without it only gzip variants are built
+    brotli = None
+
+# Bundles by name, each built from files under ``static/`` in this order.
+# Bundles are served from ``/assets/``, so relative ``url(...)`` references in
+# the stylesheets are rewritten to ``/static/`` paths when they are built.
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'deferred.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+MANIFEST = 'manifest.json'
+
+# Precompressed variants by Content-Encoding, best first.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+# ----------------------------------------------------------------------------#
+# Building.
+# ----------------------------------------------------------------------------#
+
+_CSS_STRING_OR_COMMENT = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*(?!!).*?\*/', re.S)
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace; strings are left untouched."""
+    pieces = []
+    position = 0
+    for match in _CSS_STRING_OR_COMMENT.finditer(source):
+        pieces.append(_squeeze_css(source[position:match.start()]))
+        pieces.append(match.group(1) or '')
+        position = match.end()
+    pieces.append(_squeeze_css(source[position:]))
+    return ''.join(pieces).strip()
+
+
+def _squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    return text.replace(';}', '}')
+
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def rebase_css_urls(source, name, static_url):
+    """Point relative ``url()`` references of ``static/<name>`` at ``static_url``."""
+    def rebase(match):
+        quote, url = match.groups()
+        if url.startswith(('/', '#', 'data:')) or re.match(r'^[a-z][a-z0-9+.-]*:', url, re.I):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url, re.S).groups()
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        return f'url({quote}{static_url}/{path}{suffix}{quote})'
+    return _CSS_URL.sub(rebase, source)
+
+
+def bundle_source(static_folder, files, static_url):
+    sources = []
+    for name in files:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as source:
+            text = source.read()
+        sources.append(rebase_css_urls(text, name, static_url) if name.endswith('.css') else text)
+    return sources
+
+
+def build_bundle(name, sources):
+    if name.endswith('.css'):
+        return '\n'.join(minify_css(source) for source in sources)
+    # scripts are concatenated as they are; the libraries ship minified
+    return '\n;'.join(source.strip() for source in sources) + '\n'
+
+
+def fingerprinted(name, content):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def write_variants(path, content):
+    with open(path, 'wb') as file:
+        file.write(content)
+    # mtime=0 keeps the .gz bytes reproducible between builds
+    with open(path + '.gz', 'wb') as file:
+        file.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as file:
+            file.write(brotli.compress(content, quality=11))
+
+
+def build(static_folder, dist_folder, static_url='/static'):
+    """Write every bundle with its variants and the manifest; return the manifest."""
+    os.makedirs(dist_folder, exist_ok=True)
+    manifest = {}
+    for name, files in BUNDLES.items():
+        content = build_bundle(name, bundle_source(static_folder, files, static_url)).encode('utf-8')
+        manifest[name] = fingerprinted(name, content)
+        write_variants(os.path.join(dist_folder, manifest[name]), content)
+    with open(os.path.join(dist_folder, MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    return manifest
+
+
+# ----------------------------------------------------------------------------#
+# Serving.
+# ----------------------------------------------------------------------------#
+
+class Assets:
+    """Fingerprinted, precompressed bundles under ``/assets/``.
+
+    ``flask assets`` builds them into ``ASSETS_FOLDER`` (``static/dist``).
+    Templates call ``asset_urls(bundle)``: the single hashed bundle once
+    built, the source files from ``static/`` until then. Hashed names never
+    change content, so they are served as immutable, picking the ``.br`` or
+    ``.gz`` variant the client accepts.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_FOLDER', os.path.join(app.static_folder, 'dist'))
+        app.extensions['assets'] = {'manifest': None, 'mtime': None}
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_urls'] = self.urls
+        app.cli.add_command(assets_command)
+
+    @staticmethod
+    def manifest():
+        """The built manifest, reread only when the file changes."""
+        state = current_app.extensions['assets']
+        path = os.path.join(current_app.config['ASSETS_FOLDER'], MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return {}
+        if mtime != state['mtime']:
+            with open(path) as file:
+                state['manifest'], state['mtime'] = json.load(file), mtime
+        return state['manifest']
+
+    def urls(self, name):
+        built = self.manifest().get(name)
+        if built is not None:
+            return [url_for('assets', filename=built)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        if filename not in self.manifest().values():
+            abort(404)
+        folder = current_app.config['ASSETS_FOLDER']
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.exists(os.path.join(folder, filename + suffix)):
+                response = send_from_directory(folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(folder, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+@click.command('assets')
+@with_appcontext
+def assets_command():
+    """Build the fingerprinted, precompressed static bundles."""
+    manifest = build(current_app.static_folder, current_app.config['ASSETS_FOLDER'],
+                     current_app.static_url_path)
+    for name, built in sorted(manifest.items()):
+        click.echo(f'{name} -> {built}', err=True)
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written', err=True)
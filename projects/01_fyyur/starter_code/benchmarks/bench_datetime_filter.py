@@ -0,0 +1,61 @@
+"""Microbenchmark for the ``datetime`` template filter.
+
+Renders the start times of a listing page the way the templates used to
+(strftime, dateutil parse, babel format per tile) and the way
+``formatting.format_datetime`` does now, then prints both timings.
+
+    python benchmarks/bench_datetime_filter.py --tiles 5000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates  # noqa: E402
+import dateutil.parser  # noqa: E402
+
+from formatting import FORMATS, format_datetime  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, FORMATS[format], locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=5000, help='show tiles per page')
+    parser.add_argument('--distinct', type=int, default=500, help='distinct start times among the tiles')
+    parser.add_argument('--pages', type=int, default=5, help='page renders to time')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = datetime(2026, 1, 1, 20, 0)
+    times = [base + timedelta(hours=rng.randrange(24 * 365)) for _ in range(args.distinct)]
+    tiles = [rng.choice(times) for _ in range(args.tiles)]
+
+    def legacy_page():
+        for start_time in tiles:
+            legacy_format_datetime(start_time.strftime('%Y-%m-%d %H:%M:%S'), 'full')
+
+    def current_page():
+        for start_time in tiles:
+            format_datetime(start_time, 'full')
+
+    for start_time in times:
+        assert legacy_format_datetime(start_time.strftime('%Y-%m-%d %H:%M:%S'), 'full') == \
+            format_datetime(start_time, 'full')
+
+    legacy = timeit.timeit(legacy_page, number=args.pages) / args.pages
+    current = timeit.timeit(current_page, number=args.pages) / args.pages
+    print(f'{args.tiles} tiles, {args.distinct} distinct start times, {args.pages} pages')
+    print(f'legacy : {legacy * 1000:9.2f} ms/page')
+    print(f'current: {current * 1000:9.2f} ms/page ({current / legacy:.1%} of legacy)')
+
+
+if __name__ == '__main__':
+    main()
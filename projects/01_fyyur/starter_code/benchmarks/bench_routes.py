@@ -0,0 +1,457 @@
+"""Load-test every page and API route and record latency, queries and memory.
+
+Requests go through the Flask test client in this process, or with
+``--url`` to an already running server (e.g. ``gunicorn app:app``). Each
+route reports p50/p95/p99 latency and the SQL statements per request taken
+from the ``Server-Timing`` header. Peak RSS is that of this process, or of
+``--server-pid`` when benchmarking a server. Results are written as JSON
+under ``benchmarks/results/`` and can be compared against an earlier run.
+
+Write routes create, edit and delete rows named ``bench-...`` that the
+run seeds itself and deletes again at the end, leaving the data as it
+was. Against a server they need ``WTF_CSRF_ENABLED = False`` there.
+
+    python benchmarks/generate_data.py --create-all
+    python benchmarks/bench_routes.py --requests 200
+    python benchmarks/bench_routes.py --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from app import app  # noqa: E402
+from assets import Assets  # noqa: E402
+from config import db  # noqa: E402
+from geocoding import CITY_CENTERS  # noqa: E402
+from models import Venue, Artist, Area, Genre, Show  # noqa: E402
+
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+# ----------------------------------------------------------------------------#
+# Routes.
+#
+# Each entry is (name, method, path template, form). Templates are filled
+# from ids sampled out of the database before every request, so detail
+# pages are spread over the data rather than served from one hot row. A
+# form given as a string is a JSON body.
+# ----------------------------------------------------------------------------#
+
+# Name prefix of every row the write routes create, edit or delete.
+BENCH = 'bench-'
+
+VENUE_FORM = {
+    'name': f'{BENCH}venue-{{n}}', 'city': '{city_name}', 'state': '{state_name}', 'address': '{n} Bench St',
+    'phone': '555-555-5555', 'genres': 'Jazz', 'facebook_link': 'https://www.facebook.com/bench',
+}
+ARTIST_FORM = {
+    'name': f'{BENCH}artist-{{n}}', 'city': '{city_name}', 'state': '{state_name}',
+    'phone': '555-555-5555', 'genres': 'Jazz', 'facebook_link': 'https://www.facebook.com/bench',
+}
+SHOW_FORM = {
+    'venue_id': '{bench_venue_id}', 'artist_id': '{bench_artist_id}', 'start_time': '{slot}',
+    'duration_minutes': '120',
+}
+
+ROUTES = [
+    ('home', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues by genre', 'GET', '/venues?genre={genre}', None),
+    ('area venues', 'GET', '/venues/areas/{state}/{city}', None),
+    ('venue', 'GET', '/venues/{venue_id}', None),
+    ('venue availability', 'GET', '/venues/{venue_id}/availability', None),
+    ('venue calendar', 'GET', '/venues/{venue_id}/calendar.ics', None),
+    ('suggest venues', 'GET', '/venues/suggest?q={prefix}', None),
+    ('venue edit form', 'GET', '/venues/{venue_id}/edit', None),
+    ('venue create form', 'GET', '/venues/create', None),
+    ('search venues', 'POST', '/venues/search', {'search_term': '{word}'}),
+    ('venues nearby', 'GET', '/venues/nearby?lat={lat}&lon={lon}&radius=10', None),
+    ('artists', 'GET', '/artists', None),
+    ('artists by genre', 'GET', '/artists?genre={genre}', None),
+    ('artist', 'GET', '/artists/{artist_id}', None),
+    ('artist edit form', 'GET', '/artists/{artist_id}/edit', None),
+    ('artist create form', 'GET', '/artists/create', None),
+    ('artist calendar', 'GET', '/artists/{artist_id}/calendar.ics', None),
+    ('suggest artists', 'GET', '/artists/suggest?q={prefix}', None),
+    ('search artists', 'POST', '/artists/search', {'search_term': '{word}'}),
+    ('shows', 'GET', '/shows', None),
+    ('search shows', 'POST', '/shows/search', {'search_term': '{today}'}),
+    ('show create form', 'GET', '/shows/create', None),
+    ('api venues', 'GET', '/api/v1/venues', None),
+    ('api venue', 'GET', '/api/v1/venues/{venue_id}', None),
+    ('api artists', 'GET', '/api/v1/artists', None),
+    ('api artist', 'GET', '/api/v1/artists/{artist_id}', None),
+    ('api shows', 'GET', '/api/v1/shows', None),
+    ('api show', 'GET', '/api/v1/shows/{show_id}', None),
+    ('image', 'GET', '/images/{image}', None),
+    ('asset', 'GET', '/assets/{asset}', None),
+    # streamed: their Server-Timing query counts stop where the body starts
+    ('export shows', 'GET', '/export/shows.ndjson?since_id={shows_after}', None),
+    ('export venues', 'GET', '/export/venues.csv?since_id={venues_after}', None),
+    # writes, on bench-* rows only
+    ('create venue', 'POST', '/venues/create', VENUE_FORM),
+    ('edit venue', 'POST', '/venues/{bench_venue_id}/edit', dict(VENUE_FORM, name=f'{BENCH}venue-edited-{{n}}')),
+    ('delete venue', 'DELETE', '/venues/{doomed_venue_id}', None),
+    ('bulk delete venues', 'DELETE', '/venues', '{{"ids": {doomed_venue_ids}}}'),
+    ('create artist', 'POST', '/artists/create', ARTIST_FORM),
+    ('edit artist', 'POST', '/artists/{bench_artist_id}/edit', dict(ARTIST_FORM, name=f'{BENCH}artist-edited-{{n}}')),
+    ('bulk delete artists', 'DELETE', '/artists', '{{"ids": {doomed_artist_ids}}}'),
+    ('create show', 'POST', '/shows/create', SHOW_FORM),
+]
+
+# Venues and artists that edits and new shows are spread over.
+BENCH_ROWS = 20
+
+# Ids per bulk delete request.
+BULK_DELETE = 10
+
+# Rows each request of a delete route consumes, seeded before it runs.
+CONSUMES = {
+    'delete venue': ('venue', 1),
+    'bulk delete venues': ('venue', BULK_DELETE),
+    'bulk delete artists': ('artist', BULK_DELETE),
+}
+
+# New shows go into disjoint slots this far apart, after every real show.
+SLOT_HOURS = 3
+
+# Exports resume this many rows before the end of their table, so each
+# request streams a bounded tail however large the data set is.
+EXPORT_ROWS = 1000
+
+WORDS = ['blue', 'echo', 'neon', 'hall', 'club', 'band', 'sound', 'the', 'ro']
+
+
+class Params(dict):
+    """Path parameters; rows a delete consumes are only taken when referenced."""
+
+    def __init__(self, sampler, values):
+        super().__init__(values)
+        self.sampler = sampler
+
+    def __missing__(self, key):
+        value = self[key] = self.sampler.take(key)
+        return value
+
+
+class Sampler:
+    """Random path parameters drawn from the rows in the database."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        with app.app_context():
+            self.venue_ids = [id for id, in db.session.query(Venue.id)]
+            self.artist_ids = [id for id, in db.session.query(Artist.id)]
+            self.show_ids = [id for id, in db.session.query(Show.id)]
+            self.areas = db.session.query(Area.state, Area.city).all()
+            self.genres = [name for name, in db.session.query(Genre.name)]
+            last_show_id = db.session.query(db.func.max(Show.id)).scalar() or 0
+            last_start = db.session.query(db.func.max(Show.start_time)).scalar() or datetime.today()
+            self.images = [os.path.basename(path) for _, _, path in app.extensions['image_proxy']._blobs()]
+            self.assets = sorted(Assets.manifest().values())
+        ids = sorted(self.venue_ids)
+        self.venues_after = ids[-EXPORT_ROWS - 1] if len(ids) > EXPORT_ROWS else 0
+        self.shows_after = max(0, last_show_id - EXPORT_ROWS)
+        self.first_slot = last_start.replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.counter = itertools.count()
+        self.bench = {'venue': [], 'artist': []}
+        self.doomed = {'venue': deque(), 'artist': deque()}
+        if not (self.venue_ids and self.artist_ids and self.areas):
+            sys.exit('no data to benchmark; run benchmarks/generate_data.py first')
+
+    def params(self):
+        state, city = self.rng.choice(self.areas)
+        latitude, longitude = self.rng.choice(list(CITY_CENTERS.values()))
+        n = next(self.counter)
+        return Params(self, {
+            'venue_id': self.rng.choice(self.venue_ids),
+            'artist_id': self.rng.choice(self.artist_ids),
+            'show_id': self.rng.choice(self.show_ids) if self.show_ids else None,
+            'state': urllib.parse.quote(state),
+            'city': urllib.parse.quote(city),
+            'state_name': state,
+            'city_name': city,
+            'genre': urllib.parse.quote(self.rng.choice(self.genres)),
+            'word': self.rng.choice(WORDS),
+            'prefix': self.rng.choice(WORDS)[:3],
+            'today': datetime.today().date().isoformat(),
+            'lat': latitude,
+            'lon': longitude,
+            'shows_after': self.shows_after,
+            'venues_after': self.venues_after,
+            'image': self.rng.choice(self.images) if self.images else None,
+            'asset': self.rng.choice(self.assets) if self.assets else None,
+            'n': n,
+            'slot': f'{self.first_slot + timedelta(hours=SLOT_HOURS * n):%Y-%m-%d %H:%M:%S}',
+            'bench_venue_id': self.rng.choice(self.bench['venue']) if self.bench['venue'] else None,
+            'bench_artist_id': self.rng.choice(self.bench['artist']) if self.bench['artist'] else None,
+        })
+
+    def take(self, key):
+        kind, _, plural = key[len('doomed_'):].partition('_id')
+        doomed = self.doomed[kind]
+        if not plural:
+            return doomed.popleft()
+        return json.dumps([doomed.popleft() for _ in range(min(BULK_DELETE, len(doomed)))])
+
+
+# ----------------------------------------------------------------------------#
+# Bench rows.
+# ----------------------------------------------------------------------------#
+
+def seed(sampler, kind, count):
+    """Insert ``count`` bench venues or artists and return their ids."""
+    model = Venue if kind == 'venue' else Artist
+    with app.app_context():
+        jazz = Genre.query.filter_by(name='Jazz').one()
+        rows = []
+        for _ in range(count):
+            params = sampler.params()
+            row = model(name=f'{BENCH}{kind}-{params["n"]}', city=params['city_name'],
+                        state=params['state_name'], phone='555-555-5555', genres=[jazz])
+            if kind == 'venue':
+                row.address = f'{params["n"]} Bench St'
+            rows.append(row)
+        db.session.add_all(rows)
+        db.session.flush()
+        ids = [row.id for row in rows]
+        db.session.commit()
+        return ids
+
+
+def clean_up(client):
+    """Delete every bench row through the app, so caches and areas follow."""
+    with app.app_context():
+        leftovers = {
+            'venues': [id for id, in db.session.query(Venue.id).filter(Venue.name.startswith(BENCH))],
+            'artists': [id for id, in db.session.query(Artist.id).filter(Artist.name.startswith(BENCH))],
+        }
+        db.session.remove()
+    for kind, ids in leftovers.items():
+        for start in range(0, len(ids), 500):
+            client.request('DELETE', f'/{kind}', json.dumps({'ids': ids[start:start + 500]}))
+
+
+# ----------------------------------------------------------------------------#
+# Clients.
+# ----------------------------------------------------------------------------#
+
+class TestClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form):
+        if isinstance(form, str):
+            response = self.client.open(path, method=method, data=form, content_type='application/json')
+        else:
+            response = self.client.open(path, method=method, data=form)
+        # read streamed bodies too, or exports would never run their queries
+        response.get_data()
+        response.close()
+        return response.status_code, response.headers.getlist('Server-Timing')
+
+
+class HTTPClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, form):
+        headers = {}
+        if isinstance(form, str):
+            data = form.encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            data = urllib.parse.urlencode(form).encode() if form is not None else None
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, response.headers.get_all('Server-Timing') or []
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get_all('Server-Timing') or []
+
+
+def peak_rss_kb(pid=None):
+    if pid is None:
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return None
+
+
+# ----------------------------------------------------------------------------#
+# Measuring.
+# ----------------------------------------------------------------------------#
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def queries_of(server_timing):
+    for header in server_timing:
+        match = SERVER_TIMING_QUERIES.search(header)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def bench_route(client, sampler, method, template, form, requests, warmup):
+    latencies = []
+    queries = []
+    errors = 0
+    for number in range(warmup + requests):
+        params = sampler.params()
+        path = template.format_map(params)
+        if isinstance(form, str):
+            data = form.format_map(params)
+        else:
+            data = {key: value.format_map(params) for key, value in form.items()} if form else None
+        started = time.perf_counter()
+        status, server_timing = client.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        if number < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        if status >= 400:
+            errors += 1
+        count = queries_of(server_timing)
+        if count is not None:
+            queries.append(count)
+    latencies.sort()
+    return {
+        'path': template,
+        'method': method,
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------------------------------------#
+# Reporting.
+# ----------------------------------------------------------------------------#
+
+def print_results(results, baseline=None):
+    routes = baseline['routes'] if baseline else {}
+    print(f'{"route":<22} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"errors":>6}')
+    for name, result in results['routes'].items():
+        line = (f'{name:<22} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                f'{result["queries_per_request"] if result["queries_per_request"] is not None else "-":>8} '
+                f'{result["errors"]:>6}')
+        before = routes.get(name)
+        if before:
+            line += f'   p95 {result["p95_ms"] / before["p95_ms"] - 1:+.0%}'
+            if result['queries_per_request'] is not None and before['queries_per_request'] is not None:
+                line += f', queries {result["queries_per_request"] - before["queries_per_request"]:+g}'
+        print(line)
+    rss = results['peak_rss_kb']
+    print(f'peak RSS: {rss / 1024:.1f} MiB' if rss else 'peak RSS: unknown', end='')
+    if baseline and baseline.get('peak_rss_kb') and rss:
+        print(f' ({rss / baseline["peak_rss_kb"] - 1:+.0%})', end='')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per route first')
+    parser.add_argument('--route', action='append', help='only these routes (by name); repeatable')
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--server-pid', type=int, help='process whose peak RSS to report with --url')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on (test client only)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', type=argparse.FileType('r'), help='earlier results to compare against')
+    args = parser.parse_args()
+
+    if args.url:
+        client = HTTPClient(args.url)
+    else:
+        app.config['RESPONSE_CACHE_ENABLED'] = args.cache
+        app.config['WTF_CSRF_ENABLED'] = False
+        client = TestClient()
+    # rows left behind by an interrupted run would skew this one
+    clean_up(client)
+    sampler = Sampler(random.Random(args.seed))
+    sampler.bench['venue'] = seed(sampler, 'venue', BENCH_ROWS)
+    sampler.bench['artist'] = seed(sampler, 'artist', BENCH_ROWS)
+
+    with app.app_context():
+        database = db.engine.url.get_backend_name()
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'target': args.url or 'test client',
+        'database': database if not args.url else None,
+        'cache': args.cache if not args.url else None,
+        'rows': {'venues': len(sampler.venue_ids), 'artists': len(sampler.artist_ids)},
+        'routes': {},
+    }
+    try:
+        for name, method, template, form in ROUTES:
+            if args.route and name not in args.route:
+                continue
+            fields = f'{template} {form if isinstance(form, str) else " ".join((form or {}).values())}'
+            missing = [key for key, value in sampler.params().items() if value is None and f'{{{key}}}' in fields]
+            if missing:
+                print(f'{name}: skipped, nothing to draw {", ".join(missing)} from', file=sys.stderr)
+                continue
+            if name in CONSUMES:
+                kind, per_request = CONSUMES[name]
+                sampler.doomed[kind].extend(seed(sampler, kind, (args.warmup + args.requests) * per_request))
+            results['routes'][name] = bench_route(client, sampler, method, template, form,
+                                                  args.requests, args.warmup)
+            print(f'{name}: done', file=sys.stderr)
+    finally:
+        clean_up(client)
+    results['peak_rss_kb'] = peak_rss_kb(args.server_pid) if args.server_pid or not args.url else None
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f'{datetime.now():%Y%m%d-%H%M%S}-{results["commit"] or "unknown"}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    print_results(results, json.load(args.compare) if args.compare else None)
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
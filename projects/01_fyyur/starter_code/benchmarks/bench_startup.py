@@ -0,0 +1,98 @@
+"""Measure cold starts: fresh processes importing the app and serving one request.
+
+Each run starts a new interpreter, imports ``app`` and sends the first
+request through the test client, so nothing is warm but the OS file cache.
+Reports min/p50/max of the whole process, the import and the first
+response, plus the heaviest imports of one run. Results are written as JSON
+under ``benchmarks/results/`` and can be compared against an earlier run.
+
+    python benchmarks/bench_startup.py --runs 20
+    python benchmarks/bench_startup.py --compare benchmarks/results/startup-<earlier>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from startup import cold_start, direct_imports, import_times  # noqa: E402
+
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+MEASURES = ('process_ms', 'import_ms', 'first_response_ms')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(values):
+    return {
+        'min': round(min(values), 1),
+        'p50': round(statistics.median(values), 1),
+        'max': round(max(values), 1),
+    }
+
+
+def print_results(results, baseline=None):
+    print(f'{"":<18} {"min ms":>8} {"p50 ms":>8} {"max ms":>8}')
+    for measure in MEASURES:
+        summary = results['timings'][measure]
+        line = f'{measure[:-3]:<18} {summary["min"]:>8.1f} {summary["p50"]:>8.1f} {summary["max"]:>8.1f}'
+        if baseline:
+            line += f'   p50 {summary["p50"] / baseline["timings"][measure]["p50"] - 1:+.0%}'
+        print(line)
+    print('heaviest imports:', ', '.join(f'{name} {ms:.0f} ms' for name, ms in results['imports']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes to time')
+    parser.add_argument('--path', default='/', help='path of the first request')
+    parser.add_argument('--module', default='app', help='module that creates ``app``')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/startup-<time>-<commit>.json)')
+    parser.add_argument('--compare', type=argparse.FileType('r'), help='earlier results to compare against')
+    args = parser.parse_args()
+
+    # one unmeasured run fills the OS file cache and the bytecode caches
+    cold_start(args.module, args.path, ROOT)
+    runs = []
+    for number in range(args.runs):
+        runs.append(cold_start(args.module, args.path, ROOT))
+        print(f'\rrun {number + 1}/{args.runs}', end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'path': args.path,
+        'runs': args.runs,
+        'timings': {measure: summarize([run[measure] for run in runs]) for measure in MEASURES},
+        'imports': [(name, round(cumulative, 1))
+                    for name, _, _, cumulative in direct_imports(import_times(args.module, ROOT), args.module)[:8]],
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f'startup-{datetime.now():%Y%m%d-%H%M%S}-{results["commit"] or "unknown"}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    print_results(results, json.load(args.compare) if args.compare else None)
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Fill the database with reproducible synthetic venues, artists and shows.
+
+Volumes are configurable; the same ``--seed`` always yields the same rows.
+Shows cluster around today: most are in the past two years and thin out
+with age, a quarter are upcoming and thin out with distance, and all start
+in one of three evening slots. No venue or artist is ever double-booked,
+so the data also loads under the PostgreSQL exclusion constraints.
+
+    DATABASE_URL=sqlite:////tmp/fyyur-bench.db \\
+        python benchmarks/generate_data.py --venues 100000 --artists 50000 --shows 5000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from areas import refresh_areas  # noqa: E402
+from config import db  # noqa: E402
+from geocoding import OfflineGeocoder  # noqa: E402
+from geohash import encode  # noqa: E402
+from models import Venue, Artist, Show, Genre, seed_genres, venue_genres, artist_genres  # noqa: E402
+
+PAST_DAYS = 730
+UPCOMING_DAYS = 180
+UPCOMING_SHARE = 0.25
+# (hour, minute) slots; two-hour shows in them never overlap
+SLOTS = ((17, 0), (19, 30), (22, 0))
+DURATION_MINUTES = 120
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('San Diego', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Houston', 'TX'), ('Chicago', 'IL'), ('Seattle', 'WA'),
+    ('Portland', 'OR'), ('Denver', 'CO'), ('Nashville', 'TN'), ('Atlanta', 'GA'), ('Miami', 'FL'),
+    ('Boston', 'MA'), ('New Orleans', 'LA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'),
+    ('Philadelphia', 'PA'), ('Phoenix', 'AZ'),
+]
+WORDS = ['Blue', 'Velvet', 'Echo', 'Neon', 'Golden', 'Silver', 'Midnight', 'Electric', 'Wild',
+         'Rusty', 'Lucky', 'Crimson', 'Hollow', 'Paper', 'Iron', 'Copper', 'Marble', 'Static']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Club', 'Bar', 'Theatre', 'Garage', 'Cellar', 'House']
+ARTIST_NOUNS = ['Band', 'Trio', 'Collective', 'Orchestra', 'Project', 'Sound', 'Brothers', 'Kids']
+
+
+class Bitset:
+    """One bit per (owner, day, slot): which bookings are already taken."""
+
+    def __init__(self, owners, days):
+        self.width = days * len(SLOTS)
+        self.bits = bytearray((owners + 1) * self.width // 8 + 1)
+
+    def take(self, owner, day, slot):
+        index = owner * self.width + day * len(SLOTS) + slot
+        byte, bit = divmod(index, 8)
+        if self.bits[byte] >> bit & 1:
+            return False
+        self.bits[byte] |= 1 << bit
+        return True
+
+    def release(self, owner, day, slot):
+        index = owner * self.width + day * len(SLOTS) + slot
+        byte, bit = divmod(index, 8)
+        self.bits[byte] &= ~(1 << bit)
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(table, rows, batch_size, label):
+    started = time.perf_counter()
+    count = 0
+    for batch in batched(rows, batch_size):
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+        print(f'\r{label}: {count}', end='', file=sys.stderr)
+    print(f'\r{label}: {count} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+def owner_rows(rng, count, first_id, nouns, extra):
+    for offset in range(count):
+        city, state = rng.choice(CITIES)
+        row = {
+            'id': first_id + offset,
+            'name': f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(nouns)} {first_id + offset}',
+            'city': city,
+            'state': state,
+            'phone': f'{rng.randrange(200, 999)}-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}',
+            'image_link': '',
+            'facebook_link': '',
+            'website_link': '',
+            'seeking_description': '',
+        }
+        row.update(extra(rng))
+        yield row
+
+
+def located(rows):
+    # rows are inserted without the ORM, so geocode here as the session hook would
+    geocoder = OfflineGeocoder()
+    for row in rows:
+        latitude, longitude = geocoder.geocode(row['address'], row['city'], row['state'])
+        row.update(latitude=latitude, longitude=longitude, geohash=encode(latitude, longitude))
+        yield row
+
+
+def genre_rows(rng, key, first_id, count, genre_ids):
+    for owner_id in range(first_id, first_id + count):
+        for genre_id in rng.sample(genre_ids, rng.randint(1, 3)):
+            yield {key: owner_id, 'genre_id': genre_id}
+
+
+def show_day(rng):
+    """Day index into [today - PAST_DAYS, today + UPCOMING_DAYS), skewed to today."""
+    if rng.random() < UPCOMING_SHARE:
+        return PAST_DAYS + int(rng.triangular(0, UPCOMING_DAYS, 0))
+    return PAST_DAYS - 1 - int(rng.triangular(0, PAST_DAYS, 0))
+
+
+def show_rows(rng, count, venues, artists, first_venue_id, first_artist_id):
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    first_day = today - timedelta(days=PAST_DAYS)
+    days = PAST_DAYS + UPCOMING_DAYS
+    venue_slots = Bitset(venues, days)
+    artist_slots = Bitset(artists, days)
+    produced = 0
+    while produced < count:
+        venue, artist = rng.randrange(venues), rng.randrange(artists)
+        day, slot = show_day(rng), rng.randrange(len(SLOTS))
+        if not venue_slots.take(venue, day, slot):
+            continue
+        if not artist_slots.take(artist, day, slot):
+            venue_slots.release(venue, day, slot)
+            continue
+        hour, minute = SLOTS[slot]
+        yield {
+            'venue_id': first_venue_id + venue,
+            'artist_id': first_artist_id + artist,
+            'start_time': first_day + timedelta(days=day, hours=hour, minutes=minute),
+            'duration_minutes': DURATION_MINUTES,
+        }
+        produced += 1
+
+
+def next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def sync_sequence(model):
+    # ids were given explicitly; move the serial past them
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{model.__tablename__}\"', 'id'), max(id)) "
+            f'FROM "{model.__tablename__}"'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--create-all', action='store_true',
+                        help='create missing tables instead of relying on migrations')
+    args = parser.parse_args()
+
+    capacity = min(args.venues, args.artists) * (PAST_DAYS + UPCOMING_DAYS) * len(SLOTS)
+    if args.shows > capacity // 2:
+        parser.error(f'at most {capacity // 2} shows fit {args.venues} venues and {args.artists} artists')
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if args.create_all:
+            db.create_all()
+        seed_genres()
+        genre_ids = [id for id, in db.session.query(Genre.id).order_by(Genre.id)]
+        first_venue_id, first_artist_id = next_id(Venue), next_id(Artist)
+
+        insert(Venue.__table__, located(owner_rows(rng, args.venues, first_venue_id, VENUE_NOUNS, lambda rng: {
+            'address': f'{rng.randrange(1, 9999)} {rng.choice(WORDS)} St',
+            'seeking_talent': rng.random() < 0.3,
+        })), args.batch_size, 'venues')
+        insert(venue_genres, genre_rows(rng, 'venue_id', first_venue_id, args.venues, genre_ids),
+               args.batch_size, 'venue genres')
+        insert(Artist.__table__, owner_rows(rng, args.artists, first_artist_id, ARTIST_NOUNS, lambda rng: {
+            'seeking_venue': rng.random() < 0.3,
+        }), args.batch_size, 'artists')
+        insert(artist_genres, genre_rows(rng, 'artist_id', first_artist_id, args.artists, genre_ids),
+               args.batch_size, 'artist genres')
+        insert(Show.__table__, show_rows(rng, args.shows, args.venues, args.artists,
+                                         first_venue_id, first_artist_id),
+               args.batch_size, 'shows')
+
+        for model in (Venue, Artist):
+            sync_sequence(model)
+        refresh_areas()
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import random
+import threading
+from datetime import timedelta
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import db
+from models import Show, MAX_SHOW_MINUTES
+
+# SQLSTATE raised by an EXCLUDE constraint.
+EXCLUSION_VIOLATION = '23P01'
+
+# Constraint names from the migration, by the column they keep free.
+CONSTRAINTS = {
+    'ex_Show_venue_id_during': 'venue_id',
+    'ex_Show_artist_id_during': 'artist_id',
+}
+
+
+class BookingConflict(Exception):
+    """A show overlaps another show at the same venue or by the same artist."""
+
+    def __init__(self, field, show_id=None):
+        self.field = field
+        self.show_id = show_id
+        who = 'venue' if field == 'venue_id' else 'artist'
+        super().__init__(f'The {who} is already booked at that time.')
+
+
+# ----------------------------------------------------------------------------#
+# In-process interval index.
+#
+# PostgreSQL rejects overlapping shows itself through GiST exclusion
+# constraints. Elsewhere (SQLite in development and tests) bookings are
+# checked against these indexes, built lazily from the table and then kept
+# current from committed sessions like the search indexes.
+# ----------------------------------------------------------------------------#
+
+class _Node:
+    __slots__ = ('start', 'end', 'id', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, start, end, id):
+        self.start, self.end, self.id = start, end, id
+        self.priority = random.random()
+        self.max_end = end
+        self.left = self.right = None
+
+    @property
+    def order(self):
+        return self.start, self.id
+
+
+def _update(node):
+    node.max_end = node.end
+    for child in (node.left, node.right):
+        if child is not None and child.max_end > node.max_end:
+            node.max_end = child.max_end
+    return node
+
+
+def _rotate_right(node):
+    top = node.left
+    node.left, top.right = top.right, node
+    _update(node)
+    return _update(top)
+
+
+def _rotate_left(node):
+    top = node.right
+    node.right, top.left = top.left, node
+    _update(node)
+    return _update(top)
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.order < node.order:
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    return _update(node)
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _remove(node, order):
+    if node is None:
+        return None
+    if order < node.order:
+        node.left = _remove(node.left, order)
+    elif order > node.order:
+        node.right = _remove(node.right, order)
+    else:
+        return _merge(node.left, node.right)
+    return _update(node)
+
+
+class IntervalIndex:
+    """Half-open ``[start, end)`` intervals per key.
+
+    Each key holds a treap ordered by start and augmented with the largest
+    end in every subtree, so adding, discarding and finding an overlap are
+    O(log n) expected even when stored intervals overlap each other (legacy
+    rows on SQLite were never checked).
+    """
+
+    def __init__(self):
+        self._roots = {}
+        self._where = {}
+
+    def add(self, key, start, end, id):
+        self._roots[key] = _insert(self._roots.get(key), _Node(start, end, id))
+        self._where[id] = key, start
+
+    def discard(self, id):
+        if id not in self._where:
+            return
+        key, start = self._where.pop(id)
+        self._roots[key] = _remove(self._roots.get(key), (start, id))
+
+    def overlapping(self, key, start, end):
+        """Id of an interval of ``key`` overlapping ``[start, end)``, or None."""
+        node = self._roots.get(key)
+        while node is not None:
+            if node.start < end and node.end > start:
+                return node.id
+            # if the left subtree reaches past ``start`` but holds no overlap,
+            # everything there starts at or after ``end`` and so does the rest
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+            else:
+                node = node.right
+        return None
+
+
+_lock = threading.RLock()
+_indexes = None
+
+_PENDING = 'bookings_pending'
+_RESET = object()
+
+
+def booking_indexes():
+    global _indexes
+    with _lock:
+        if _indexes is None:
+            indexes = {'venue_id': IntervalIndex(), 'artist_id': IntervalIndex()}
+            rows = db.session.query(Show.id, Show.venue_id, Show.artist_id,
+                                    Show.start_time, Show.duration_minutes)
+            for id, venue_id, artist_id, start_time, duration in rows:
+                end_time = start_time + timedelta(minutes=duration)
+                indexes['venue_id'].add(venue_id, start_time, end_time, id)
+                indexes['artist_id'].add(artist_id, start_time, end_time, id)
+            _indexes = indexes
+        return _indexes
+
+
+def reset():
+    global _indexes
+    with _lock:
+        _indexes = None
+
+
+def reset_on_commit(session):
+    """Rebuild the indexes once ``session`` commits rows written outside the ORM."""
+    session.info.setdefault(_PENDING, []).append(_RESET)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING, [])
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            pending.append(('discard', obj.id))
+    # an edited show is moved: discarded, then added at its new slot
+    moved = [obj for obj in session.dirty if isinstance(obj, Show) and session.is_modified(obj)]
+    pending.extend(('discard', obj.id) for obj in moved)
+    for obj in list(session.new) + moved:
+        if isinstance(obj, Show):
+            pending.append(('add', obj.id, obj.venue_id, obj.artist_id, obj.start_time, obj.end_time))
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+@event.listens_for(Session, 'after_bulk_update')
+def _collect_bulk_change(context):
+    # deleting venues or artists cascades to shows inside the database
+    reset_on_commit(context.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop(_PENDING, ())
+    with _lock:
+        if _indexes is None:
+            return
+        if _RESET in pending:
+            reset()
+            return
+        for action, id, *interval in pending:
+            if action == 'add':
+                venue_id, artist_id, start_time, end_time = interval
+                _indexes['venue_id'].add(venue_id, start_time, end_time, id)
+                _indexes['artist_id'].add(artist_id, start_time, end_time, id)
+            else:
+                for index in _indexes.values():
+                    index.discard(id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
+
+
+# ----------------------------------------------------------------------------#
+# Booking.
+# ----------------------------------------------------------------------------#
+
+def book(show):
+    """Insert and commit ``show``, raising ``BookingConflict`` on an overlap."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.add(show)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if getattr(e.orig, 'pgcode', None) != EXCLUSION_VIOLATION:
+                raise
+            raise BookingConflict(CONSTRAINTS.get(e.orig.diag.constraint_name, 'venue_id')) from e
+        return
+
+    # check and insert under the lock so two requests cannot take one slot
+    with _lock:
+        indexes = booking_indexes()
+        for field in CONSTRAINTS.values():
+            conflict = indexes[field].overlapping(getattr(show, field), show.start_time, show.end_time)
+            if conflict is not None:
+                raise BookingConflict(field, conflict)
+        db.session.add(show)
+        db.session.commit()
+
+
+def free_slots(venue_id, start, end):
+    """``(start, end)`` gaps between the shows of a venue within ``[start, end)``."""
+    # a show can start up to MAX_SHOW_MINUTES before the range and still overlap it
+    rows = db.session.query(Show.start_time, Show.duration_minutes) \
+        .filter(Show.venue_id == venue_id,
+                Show.start_time > start - timedelta(minutes=MAX_SHOW_MINUTES),
+                Show.start_time < end) \
+        .order_by(Show.start_time)
+    slots = []
+    cursor = start
+    for start_time, duration in rows:
+        if start_time > cursor:
+            slots.append((cursor, start_time))
+        cursor = max(cursor, start_time + timedelta(minutes=duration))
+    if cursor < end:
+        slots.append((cursor, end))
+    return slots
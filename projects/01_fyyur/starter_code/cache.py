@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+
+
+# ----------------------------------------------------------------------------#
+# Backends.
+# ----------------------------------------------------------------------------#
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by entry count and age.
+
+    Entries can carry tags; ``invalidate`` drops every entry holding any of
+    the given tags, which lets writers evict exactly the pages they touched.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=(), expires_at=None):
+        ttl_expiry = time.time() + self.ttl
+        expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at, frozenset(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# ----------------------------------------------------------------------------#
+# Rendered-page cache.
+# ----------------------------------------------------------------------------#
+
+class ResponseCache:
+    """Caches rendered GET responses keyed by endpoint and arguments.
+
+    The backend is ``RESPONSE_CACHE_BACKEND`` when configured (any object
+    with ``get``/``set``/``invalidate``/``clear``), otherwise an ``LRUCache``
+    sized by ``RESPONSE_CACHE_SIZE`` and ``RESPONSE_CACHE_TTL``. The default
+    backend lives in one process: ``invalidate`` evicts only there, so other
+    workers can serve a page up to ``RESPONSE_CACHE_TTL`` seconds after a
+    write. A backend shared between workers removes that window.
+
+    A page read from a replica is not stored when one of its tags was
+    invalidated here within ``REPLICA_LAG_SECONDS``: the replica may not
+    have the write yet, and storing its page would undo the invalidation.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._invalidated_at = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_SIZE', 512)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 300)
+        backend = app.config.get('RESPONSE_CACHE_BACKEND')
+        if backend is None:
+            backend = LRUCache(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'])
+        app.extensions['response_cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def cached(self, *tags):
+        """Cache the decorated view; ``tags`` are formatted with its view args."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                # pages rendering a pending flash message are one-offs
+                if not current_app.config['RESPONSE_CACHE_ENABLED'] or session.get('_flashes'):
+                    return view(**view_args)
+
+                key = (request.endpoint,
+                       tuple(sorted(view_args.items())),
+                       tuple(sorted(request.args.items(multi=True))))
+                hit = self.backend.get(key)
+                if hit is not None:
+                    body, mimetype = hit
+                    response = make_response(body)
+                    response.mimetype = mimetype
+                    return response
+
+                g.response_cache_tags = {tag.format(**view_args) for tag in tags}
+                g.response_cache_expires_at = None
+                response = make_response(view(**view_args))
+                if response.status_code == 200 and not response.is_streamed \
+                        and not self._maybe_stale(g.response_cache_tags):
+                    self.backend.set(key, (response.get_data(), response.mimetype),
+                                     tags=g.response_cache_tags,
+                                     expires_at=g.response_cache_expires_at)
+                return response
+            return wrapper
+        return decorator
+
+    def tag(self, *tags):
+        """Add tags to the page being rendered, e.g. entities it displays."""
+        if 'response_cache_tags' in g:
+            g.response_cache_tags.update(tags)
+
+    def expire_at(self, when):
+        """Drop the page being rendered no later than ``when``.
+
+        Pages split shows into upcoming and past, so they pass the start of
+        their earliest upcoming show to roll over when it begins.
+        """
+        if when is None or 'response_cache_tags' not in g:
+            return
+        timestamp = when.timestamp()
+        current = g.response_cache_expires_at
+        g.response_cache_expires_at = timestamp if current is None else min(current, timestamp)
+
+    def lookup(self, key):
+        """A value saved with ``store``, or None when absent or disabled."""
+        if not current_app.config['RESPONSE_CACHE_ENABLED']:
+            return None
+        return self.backend.get(key)
+
+    def store(self, key, value, tags=(), expires_at=None):
+        """Keep a small derived value, such as a page's validators, under tags."""
+        if current_app.config['RESPONSE_CACHE_ENABLED'] and not self._maybe_stale(tags):
+            self.backend.set(key, value, tags=tags,
+                             expires_at=None if expires_at is None else expires_at.timestamp())
+
+    def invalidate(self, *tags):
+        self.backend.invalidate(*tags)
+        now = time.time()
+        horizon = now - current_app.config.get('REPLICA_LAG_SECONDS', 0)
+        with self._lock:
+            for tag, invalidated_at in list(self._invalidated_at.items()):
+                if invalidated_at <= horizon:
+                    del self._invalidated_at[tag]
+            self._invalidated_at.update(dict.fromkeys(tags, now))
+
+    def _maybe_stale(self, tags):
+        """Whether this request read a replica that may predate a write to ``tags``."""
+        if not g.get('read_from_replica'):
+            return False
+        horizon = time.time() - current_app.config.get('REPLICA_LAG_SECONDS', 0)
+        with self._lock:
+            return any(self._invalidated_at.get(tag, 0) > horizon for tag in tags)
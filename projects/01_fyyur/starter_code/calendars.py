@@ -0,0 +1,164 @@
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Response, request
+from sqlalchemy import func
+
+from config import db, response_cache
+from models import Venue, Artist, Show
+from queries import shows_between
+
+# Calendar clients poll often; they must revalidate, which is cheap.
+CACHE_CONTROL = 'no-cache'
+
+OWNERS = {
+    'venue': (Venue, 'venue_id'),
+    'artist': (Artist, 'artist_id'),
+}
+
+
+# ----------------------------------------------------------------------------#
+# iCalendar encoding (RFC 5545).
+# ----------------------------------------------------------------------------#
+
+def escape_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF and a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces = []
+    while encoded:
+        size = 75 if not pieces else 74
+        # never cut inside a multi-byte character
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        pieces.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _local(value):
+    # start times are stored as naive wall-clock times: floating in iCalendar
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def ics_lines(name, shows, stamp):
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold('PRODID:-//Fyyur//Shows//EN')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold(f'X-WR-CALNAME:{escape_text(name)}')
+    for show in shows:
+        venue = show.venue
+        location = ', '.join(part for part in (venue.name, venue.address, venue.city, venue.state) if part)
+        yield fold('BEGIN:VEVENT')
+        yield fold(f'UID:show-{show.id}@fyyur')
+        yield fold(f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}')
+        yield fold(f'DTSTART:{_local(show.start_time)}')
+        yield fold(f'DTEND:{_local(show.end_time)}')
+        yield fold(f'SUMMARY:{escape_text(f"{show.artist.name} at {venue.name}")}')
+        yield fold(f'LOCATION:{escape_text(location)}')
+        yield fold(f'SEQUENCE:{show.version_id - 1}')
+        yield fold('END:VEVENT')
+    yield fold('END:VCALENDAR')
+
+
+# ----------------------------------------------------------------------------#
+# Feeds.
+#
+# The validators of each feed live in the response cache under the same
+# tags as the owner's page, so every write that evicts the page also
+# evicts them. While they are cached, a conditional request is answered
+# with 304 before any query runs. Last-Modified is derived from the rows
+# themselves, so it is the same on every worker and after eviction.
+# ----------------------------------------------------------------------------#
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _last_modified(kind, owner, shows, now):
+    """When the feed of ``owner`` last changed.
+
+    The latest ``updated_at`` of the owner and of every listed show, artist
+    and venue, or the start of the latest show that dropped out of the feed.
+    """
+    changes = [owner.updated_at]
+    for show in shows:
+        changes += [show.updated_at, show.artist.updated_at, show.venue.updated_at]
+    latest = max(changes)
+
+    foreign_key = getattr(Show, OWNERS[kind][1])
+    started = db.session.query(func.max(Show.start_time)) \
+        .filter(foreign_key == owner.id, Show.start_time < now).scalar()
+    if started is not None:
+        # start times are naive local wall-clock times
+        latest = max(latest, started.astimezone(timezone.utc).replace(tzinfo=None))
+    return _utc(latest)
+
+
+def touch_feeds(kind, ids):
+    """Mark the feeds sharing upcoming shows with the ``kind`` owners ``ids`` as changed.
+
+    Deleting a venue or artist removes its shows through the foreign key's
+    cascade, which leaves nothing newer behind in the other side's feeds;
+    call this before such a delete.
+    """
+    other = 'artist' if kind == 'venue' else 'venue'
+    model, foreign_key = OWNERS[other]
+    partners = db.session.query(getattr(Show, foreign_key)) \
+        .filter(getattr(Show, OWNERS[kind][1]).in_(ids), Show.start_time >= datetime.today())
+    model.query.filter(model.id.in_(partners.scalar_subquery())) \
+        .update({model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _with_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def calendar_response(kind, owner_id):
+    """The upcoming shows of one venue or artist as a ``text/calendar`` feed."""
+    key = ('calendar', kind, owner_id)
+    validators = response_cache.lookup(key)
+    if validators is not None and _not_modified(*validators):
+        return _with_validators(Response(status=304), *validators)
+
+    model, foreign_key = OWNERS[kind]
+    now = datetime.today()
+    # one query on the (venue_id | artist_id, start_time) index
+    shows = shows_between(now, **{foreign_key: owner_id}).all()
+    if shows:
+        owner = getattr(shows[0], kind)
+    else:
+        owner = model.query.get_or_404(owner_id)
+
+    etag = hashlib.sha1(repr((kind, owner.id, owner.version_id, [
+        (show.id, show.version_id, show.artist.version_id, show.venue.version_id) for show in shows
+    ])).encode()).hexdigest()
+    last_modified = _last_modified(kind, owner, shows, now)
+
+    tags = {f'{kind}:{owner.id}'}
+    tags |= {f'artist:{show.artist_id}' for show in shows} | {f'venue:{show.venue_id}' for show in shows}
+    # the feed changes when its first show starts and drops out
+    response_cache.store(key, (etag, last_modified), tags=tags,
+                         expires_at=shows[0].start_time if shows else None)
+
+    if _not_modified(etag, last_modified):
+        return _with_validators(Response(status=304), etag, last_modified)
+    response = Response(ics_lines(owner.name, shows, last_modified), mimetype='text/calendar')
+    return _with_validators(response, etag, last_modified)
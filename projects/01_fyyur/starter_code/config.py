@@ -1,32 +1,154 @@
 import os
+import sqlite3
 
 from flask import Flask
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from assets import Assets
+from cache import ResponseCache
+from images import ImageProxy
+from instrumentation import SQLInstrumentation
+from routing import RoutingSQLAlchemy, replica_binds
+from startup import LazyMigrate, LazyMoment
+from templating import TemplateCache
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = False
 
-# Connect to the database
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return default if value is None else int(value)
+
+
+# ----------------------------------------------------------------------------#
+# Settings.
+# ----------------------------------------------------------------------------#
+
+class Config:
+    # Workers must share a key for sessions and CSRF tokens to survive them.
+    SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+
+    # Enable debug mode.
+    DEBUG = env_bool('FLASK_DEBUG', False)
+
+    # Connect to the database
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://masato@localhost:5432/fyyur')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Read replicas for read-only requests, comma separated; empty disables routing.
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    # How long a client keeps reading from the primary after it wrote.
+    REPLICA_LAG_SECONDS = env_int('REPLICA_LAG_SECONDS', 10)
+
+    # Connection pool, sized per worker process.
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = env_bool('DB_POOL_PRE_PING', True)
+
+    # PostgreSQL server-side limits in milliseconds; 0 disables them.
+    DB_STATEMENT_TIMEOUT = env_int('DB_STATEMENT_TIMEOUT', 5000)
+    DB_IDLE_IN_TRANSACTION_TIMEOUT = env_int('DB_IDLE_IN_TRANSACTION_TIMEOUT', 10000)
+
+    # Rendered pages, cached per worker process. A write evicts the pages it
+    # touched only in the process that handled it; other workers may serve
+    # their copy for up to RESPONSE_CACHE_TTL seconds.
+    RESPONSE_CACHE_ENABLED = env_bool('RESPONSE_CACHE_ENABLED', True)
+    RESPONSE_CACHE_SIZE = env_int('RESPONSE_CACHE_SIZE', 512)
+    RESPONSE_CACHE_TTL = env_int('RESPONSE_CACHE_TTL', 300)
+
+    # Local thumbnails of image links; the folder defaults to instance/images.
+    IMAGE_PROXY_ENABLED = env_bool('IMAGE_PROXY_ENABLED', True)
+    IMAGE_CACHE_FOLDER = os.environ.get('IMAGE_CACHE_FOLDER')
+    IMAGE_CACHE_MAX_BYTES = env_int('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    IMAGE_ALLOW_PRIVATE_ADDRESSES = env_bool('IMAGE_ALLOW_PRIVATE_ADDRESSES', False)
+
+    # Compiled templates shared by workers; the folder defaults to instance/jinja.
+    JINJA_BYTECODE_CACHE_FOLDER = os.environ.get('JINJA_BYTECODE_CACHE_FOLDER')
+    FRAGMENT_CACHE_ENABLED = env_bool('FRAGMENT_CACHE_ENABLED', True)
+
+    # Venue geocoding: 'offline' (known city centres) or 'nominatim' at GEOCODER_URL.
+    GEOCODER = os.environ.get('GEOCODER', 'offline')
+    GEOCODER_URL = os.environ.get('GEOCODER_URL', 'https://nominatim.openstreetmap.org/search')
+    GEOCODE_ON_WRITE = env_bool('GEOCODE_ON_WRITE', True)
+
+
+def engine_options(config):
+    """SQLAlchemy ``create_engine`` arguments for the configured database."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        # SQLite picks its own pool; sizing options do not apply.
+        return {}
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if uri.startswith('postgres'):
+        settings = [
+            f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}",
+            f"-c idle_in_transaction_session_timeout={config['DB_IDLE_IN_TRANSACTION_TIMEOUT']}",
+        ]
+        options['connect_args'] = {'options': ' '.join(settings)}
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless asked per connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
 
-SQLALCHEMY_DATABASE_URI = 'postgresql://masato@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-# app.config.from_object('config')
-app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = SQLALCHEMY_TRACK_MODIFICATIONS
-app.config['DEBUG'] = DEBUG
-app.config['SECRET_KEY'] = SECRET_KEY
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = RoutingSQLAlchemy()
+moment = LazyMoment()
+migrate = LazyMigrate()
+response_cache = ResponseCache()
+sql_instrumentation = SQLInstrumentation()
+assets = Assets()
+image_proxy = ImageProxy()
+template_cache = TemplateCache()
+
+
+def create_app(config=None):
+    """Build the Flask app from ``Config`` and the environment.
+
+    ``config`` may be a mapping or an object of settings applied on top,
+    e.g. ``create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})``.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    app.config['SQLALCHEMY_BINDS'] = {
+        **(app.config.get('SQLALCHEMY_BINDS') or {}),
+        **dict(zip(replica_binds(app.config), app.config['SQLALCHEMY_REPLICA_URIS'])),
+    }
+
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    response_cache.init_app(app)
+    sql_instrumentation.init_app(app)
+    assets.init_app(app)
+    image_proxy.init_app(app)
+    template_cache.init_app(app)
+    return app
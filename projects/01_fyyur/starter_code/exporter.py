@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.orm import selectinload
+
+from config import db
+from models import Venue, Artist, Show
+
+YIELD_PER = 1000
+
+
+# ----------------------------------------------------------------------------#
+# Rows.
+#
+# Each export walks its table in id order over a server-side cursor, so a
+# dump can be resumed from the last id written and memory stays flat.
+# ----------------------------------------------------------------------------#
+
+def show_rows(since=None, since_id=None):
+    query = db.session.query(Show.id, Show.start_time,
+                             Show.artist_id, Artist.name.label('artist_name'),
+                             Show.venue_id, Venue.name.label('venue_name')) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .join(Venue, Show.venue_id == Venue.id)
+    if since is not None:
+        query = query.filter(Show.start_time >= since)
+    if since_id is not None:
+        query = query.filter(Show.id > since_id)
+    for row in query.order_by(Show.id).execution_options(stream_results=True).yield_per(YIELD_PER):
+        yield row._asdict()
+
+
+def _genre_tagged_rows(model, columns, since_id=None):
+    query = model.query.options(selectinload(model.genres))
+    if since_id is not None:
+        query = query.filter(model.id > since_id)
+    for entity in query.order_by(model.id).execution_options(stream_results=True).yield_per(YIELD_PER):
+        row = {column: getattr(entity, column) for column in columns}
+        row['genres'] = ','.join(entity.genre_names)
+        yield row
+
+
+def venue_rows(since_id=None):
+    return _genre_tagged_rows(Venue, ('id', 'name', 'city', 'state', 'address', 'phone',
+                                      'image_link', 'facebook_link', 'website_link',
+                                      'seeking_talent', 'seeking_description'), since_id)
+
+
+def artist_rows(since_id=None):
+    return _genre_tagged_rows(Artist, ('id', 'name', 'city', 'state', 'phone',
+                                       'image_link', 'facebook_link', 'website_link',
+                                       'seeking_venue', 'seeking_description'), since_id)
+
+
+EXPORTS = {
+    'shows': show_rows,
+    'venues': venue_rows,
+    'artists': artist_rows,
+}
+
+# Kinds with a time to filter ``since`` on; venues and artists have none.
+DATED = {'shows'}
+
+
+# ----------------------------------------------------------------------------#
+# Encoding.
+# ----------------------------------------------------------------------------#
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow({key: _plain(value) for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield json.dumps({key: _plain(value) for key, value in row.items()}) + '\n'
+
+
+FORMATS = {
+    'csv': (encode_csv, 'text/csv'),
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+}
+
+
+def export(kind, fmt, since=None, since_id=None):
+    """Chunks of the ``kind`` dump encoded as ``fmt``, one row at a time.
+
+    Raises ValueError if ``since`` is given for a kind not in DATED.
+    """
+    encode, _ = FORMATS[fmt]
+    if since is None:
+        return encode(EXPORTS[kind](since_id=since_id))
+    if kind not in DATED:
+        raise ValueError(f'{kind} cannot be filtered by time')
+    return encode(EXPORTS[kind](since=since, since_id=since_id))
+
+
+# ----------------------------------------------------------------------------#
+# Command.
+# ----------------------------------------------------------------------------#
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='ndjson', show_default=True)
+@click.option('--since', type=click.DateTime(), help='Only shows starting at or after this time.')
+@click.option('--since-id', type=int, help='Resume after this id.')
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+              help='Destination file (default: stdout).')
+@with_appcontext
+def export_command(kind, fmt, since, since_id, output):
+    """Stream venues, artists or shows as CSV or NDJSON."""
+    try:
+        chunks = export(kind, fmt, since=since, since_id=since_id)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--since')
+    for chunk in chunks:
+        output.write(chunk)
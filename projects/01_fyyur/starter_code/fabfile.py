@@ -13,6 +13,22 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(venues=1000, artists=500, shows=50000, requests=100, compare=None):
+    # fills a scratch SQLite database, then load-tests every route against it
+    env = "DATABASE_URL=sqlite:////tmp/fyyur-bench.db"
+    local("rm -f /tmp/fyyur-bench.db")
+    local("{} python benchmarks/generate_data.py --create-all --venues {} --artists {} --shows {}".format(
+        env, venues, artists, shows))
+    local("{} python benchmarks/bench_routes.py --requests {}{}".format(
+        env, requests, " --compare {}".format(compare) if compare else ""))
+
+
+def bench_startup(runs=10, compare=None):
+    # fresh processes importing the app and serving the first request
+    local("python benchmarks/bench_startup.py --runs {}{}".format(
+        runs, " --compare {}".format(compare) if compare else ""))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
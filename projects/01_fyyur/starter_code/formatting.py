@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# babel and dateutil are imported on first use: neither is needed to start
+# a worker, and most requests never parse a date string.
+
+# Named formats accepted by the ``datetime`` template filter.
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(pattern, locale):
+    """Parsed Babel pattern and locale, built once per (pattern, locale)."""
+    from babel import Locale
+    from babel.dates import parse_pattern
+    return parse_pattern(pattern), Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def _format(value, pattern, locale):
+    compiled, babel_locale = compiled_pattern(pattern, locale)
+    if value.tzinfo is None:
+        # babel.dates.format_datetime treats naive values as UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return compiled.apply(value, babel_locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    """Format ``value`` with a named format or a raw Babel pattern.
+
+    ``value`` is normally a ``datetime``; strings are still parsed for older
+    callers. Output is memoized, since listing pages repeat the same start
+    times across many tiles and requests.
+    """
+    if not isinstance(value, datetime):
+        value = parse_datetime(value)
+    return _format(value, FORMATS.get(format, format), locale)
+
+
+def parse_datetime(value):
+    """Parse a user-supplied date or time string; ValueError if it is none."""
+    import dateutil.parser
+    return dateutil.parser.parse(value)
@@ -1,8 +1,8 @@
 from datetime import datetime
 import re
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp, NumberRange
 
 # from .app import Artist
 from value_object.genre import Genre
@@ -77,7 +77,12 @@ class ShowForm(FlaskForm):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        default=datetime.today
+    )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[NumberRange(min=1, max=24 * 60)],
+        default=120
     )
 
 
@@ -128,7 +133,7 @@ class VenueForm(FlaskForm):
         self.city.data = venue.city
         self.state.data = venue.state
         self.address.data = venue.address
-        self.genres.data = venue.genres.split(',')
+        self.genres.data = venue.genre_names
         self.website_link.data = venue.website_link
         self.facebook_link.data = venue.facebook_link
         self.phone.data = venue.phone
@@ -142,7 +147,7 @@ class VenueForm(FlaskForm):
         venue.state = self.state.data
         venue.address = self.address.data
         venue.phone = self.phone.data
-        venue.genres = ','.join(self.genres.data)
+        venue.genre_names = self.genres.data
         venue.image_link = self.image_link.data
         venue.facebook_link = self.facebook_link.data
         venue.website_link = self.website_link.data
@@ -194,7 +199,7 @@ class ArtistForm(FlaskForm):
         self.name.data = artist.name
         self.city.data = artist.city
         self.state.data = artist.state
-        self.genres.data = artist.genres.split(',')
+        self.genres.data = artist.genre_names
         self.website_link.data = artist.website_link
         self.facebook_link.data = artist.facebook_link
         self.phone.data = artist.phone
@@ -206,7 +211,7 @@ class ArtistForm(FlaskForm):
         artist.name = self.name.data
         artist.city = self.city.data
         artist.state = self.state.data
-        artist.genres = ','.join(self.genres.data)
+        artist.genre_names = self.genres.data
         artist.website_link = self.website_link.data
         artist.facebook_link = self.facebook_link.data
         artist.phone = self.phone.data
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import urllib.parse
+import urllib.request
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+import geohash
+from config import db
+from models import Venue
+
+# Approximate centres of the cities the seed and benchmark data use.
+CITY_CENTERS = {
+    ('san francisco', 'CA'): (37.7749, -122.4194),
+    ('los angeles', 'CA'): (34.0522, -118.2437),
+    ('san diego', 'CA'): (32.7157, -117.1611),
+    ('new york', 'NY'): (40.7128, -74.0060),
+    ('brooklyn', 'NY'): (40.6782, -73.9442),
+    ('austin', 'TX'): (30.2672, -97.7431),
+    ('houston', 'TX'): (29.7604, -95.3698),
+    ('chicago', 'IL'): (41.8781, -87.6298),
+    ('seattle', 'WA'): (47.6062, -122.3321),
+    ('portland', 'OR'): (45.5152, -122.6784),
+    ('denver', 'CO'): (39.7392, -104.9903),
+    ('nashville', 'TN'): (36.1627, -86.7816),
+    ('atlanta', 'GA'): (33.7490, -84.3880),
+    ('miami', 'FL'): (25.7617, -80.1918),
+    ('boston', 'MA'): (42.3601, -71.0589),
+    ('new orleans', 'LA'): (29.9511, -90.0715),
+    ('detroit', 'MI'): (42.3314, -83.0458),
+    ('minneapolis', 'MN'): (44.9778, -93.2650),
+    ('philadelphia', 'PA'): (39.9526, -75.1652),
+    ('phoenix', 'AZ'): (33.4484, -112.0740),
+}
+
+# Offline addresses land this many degrees (about 3 miles) around their city centre.
+SPREAD_DEGREES = 0.05
+
+LOCATION_FIELDS = ('address', 'city', 'state')
+
+
+# ----------------------------------------------------------------------------#
+# Geocoders.
+#
+# A geocoder is any object with ``geocode(address, city, state)`` returning
+# ``(latitude, longitude)`` or None. ``GEOCODER`` names one of GEOCODERS or
+# is such an object.
+# ----------------------------------------------------------------------------#
+
+class OfflineGeocoder:
+    """Stand-in that needs no network: known city centres, nothing else.
+
+    Each address gets a fixed offset from its city centre derived from its
+    hash, so venues in one city are spread out but always land in the same
+    place. Meant for development, tests and benchmarks.
+    """
+
+    def geocode(self, address, city, state):
+        center = CITY_CENTERS.get(((city or '').strip().lower(), (state or '').strip().upper()))
+        if center is None:
+            return None
+        digest = hashlib.sha1((address or '').strip().lower().encode()).digest()
+        return (center[0] + (digest[0] / 255 - 0.5) * 2 * SPREAD_DEGREES,
+                center[1] + (digest[1] / 255 - 0.5) * 2 * SPREAD_DEGREES)
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim (or a compatible service) at ``GEOCODER_URL``."""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def geocode(self, address, city, state):
+        query = urllib.parse.urlencode({'street': address or '', 'city': city or '', 'state': state or '',
+                                        'country': 'us', 'format': 'json', 'limit': 1})
+        request = urllib.request.Request(f'{self.url}?{query}', headers={'User-Agent': 'fyyur-geocoder'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                places = json.load(response)
+        except (OSError, ValueError) as e:
+            current_app.logger.warning('geocoding %s, %s, %s failed: %s', address, city, state, e)
+            return None
+        if not places:
+            return None
+        return float(places[0]['lat']), float(places[0]['lon'])
+
+
+GEOCODERS = {
+    'offline': lambda config: OfflineGeocoder(),
+    'nominatim': lambda config: NominatimGeocoder(config['GEOCODER_URL']),
+}
+
+
+def geocoder():
+    """The app's geocoder, built once from ``GEOCODER``."""
+    built = current_app.extensions.get('geocoder')
+    if built is None:
+        configured = current_app.config['GEOCODER']
+        built = GEOCODERS[configured](current_app.config) if isinstance(configured, str) else configured
+        current_app.extensions['geocoder'] = built
+    return built
+
+
+def locate(venue):
+    """Geocode ``venue`` from its address; coordinates stay unset when unknown."""
+    found = geocoder().geocode(venue.address, venue.city, venue.state)
+    venue.latitude, venue.longitude = found if found is not None else (None, None)
+
+
+def set_geohash(venue):
+    if venue.latitude is None or venue.longitude is None:
+        venue.geohash = None
+    else:
+        venue.geohash = geohash.encode(venue.latitude, venue.longitude)
+
+
+# ----------------------------------------------------------------------------#
+# Keeping coordinates current.
+#
+# Venues whose address changes are geocoded again before they are flushed,
+# unless the same flush sets their coordinates explicitly. The geohash always
+# follows the coordinates.
+# ----------------------------------------------------------------------------#
+
+def _changed(venue, fields):
+    return any(get_history(venue, field).has_changes() for field in fields)
+
+
+@event.listens_for(Session, 'before_flush')
+def _geocode_changes(session, flush_context, instances):
+    geocode = has_app_context() and current_app.config['GEOCODE_ON_WRITE']
+    for venue in list(session.new) + list(session.dirty):
+        if not isinstance(venue, Venue):
+            continue
+        moved = _changed(venue, ('latitude', 'longitude'))
+        if geocode and not moved and (venue in session.new or _changed(venue, LOCATION_FIELDS)):
+            locate(venue)
+            moved = True
+        if moved or venue in session.new:
+            set_geohash(venue)
+
+
+@click.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Geocode every venue, not only those without coordinates.')
+@click.option('--batch-size', default=500, show_default=True, help='Venues geocoded per transaction.')
+@with_appcontext
+def geocode_venues_command(everything, batch_size):
+    """Fill in venue coordinates, e.g. after a bulk import."""
+    query = Venue.query.order_by(Venue.id)
+    if not everything:
+        query = query.filter(Venue.latitude.is_(None))
+    located = missing = 0
+    last_id = 0
+    while True:
+        venues = query.filter(Venue.id > last_id).limit(batch_size).all()
+        if not venues:
+            break
+        for venue in venues:
+            locate(venue)
+            set_geohash(venue)
+            if venue.latitude is None:
+                missing += 1
+            else:
+                located += 1
+        last_id = venues[-1].id
+        db.session.commit()
+    click.echo(f'{located} venues located, {missing} not found', err=True)
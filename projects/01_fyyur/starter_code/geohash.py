@@ -0,0 +1,103 @@
+import math
+
+# Geohash base32: digits and lower-case letters without a, i, l and o.
+ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+
+# Stored precision: 9 characters is a cell of about 5 x 5 metres.
+PRECISION = 9
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = math.pi * EARTH_RADIUS_MILES / 180
+
+
+# ----------------------------------------------------------------------------#
+# Encoding.
+# ----------------------------------------------------------------------------#
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point: bits alternate longitude and latitude halvings."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value << 1 | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(ALPHABET[value])
+            value = bits = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """``(height, width)`` in degrees of the cells of a precision."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def successor(prefix):
+    """The first geohash after every one starting with ``prefix``.
+
+    ``prefix <= geohash < successor(prefix)`` selects a cell with a plain
+    B-tree range scan; the bound uses only geohash characters, so it holds
+    in any collation that orders digits before lower-case letters.
+    """
+    while prefix and prefix[-1] == ALPHABET[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + ALPHABET[_VALUES[prefix[-1]] + 1]
+
+
+# ----------------------------------------------------------------------------#
+# Searching.
+# ----------------------------------------------------------------------------#
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude, longitude, radius_miles):
+    """Geohash prefixes whose cells together cover the circle, or None.
+
+    Picks the finest precision whose cells are at least ``radius_miles``
+    across, then takes the cell of the centre and its eight neighbours.
+    None means the circle is too large to prune: every point is a candidate.
+    """
+    # longitude degrees shrink towards the poles; size cells for the worst edge
+    edge_latitude = min(90.0, abs(latitude) + radius_miles / MILES_PER_DEGREE)
+    lon_miles = MILES_PER_DEGREE * math.cos(math.radians(edge_latitude))
+    precision = 0
+    for candidate in range(1, PRECISION + 1):
+        height, width = cell_size(candidate)
+        if height * MILES_PER_DEGREE < radius_miles or width * lon_miles < radius_miles:
+            break
+        precision = candidate
+    if precision == 0:
+        return None
+
+    height, width = cell_size(precision)
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        cell_latitude = latitude + d_lat * height
+        if not -90.0 <= cell_latitude <= 90.0:
+            continue
+        for d_lon in (-1, 0, 1):
+            cell_longitude = (longitude + d_lon * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
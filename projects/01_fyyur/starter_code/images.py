@@ -0,0 +1,328 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import queue
+import re
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+from flask import abort, current_app, send_from_directory, url_for
+
+# Named thumbnail boxes; images are scaled down to fit inside them.
+SIZES = {
+    'tile': (320, 240),
+    'detail': (640, 480),
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_blob_name = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+
+# Leading bytes of the formats stored as they are when Pillow is missing.
+_signatures = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+    (b'RIFF', 'webp'),
+]
+
+
+# ----------------------------------------------------------------------------#
+# Thumbnails.
+# ----------------------------------------------------------------------------#
+
+def make_thumbnail(data, box):
+    """``(bytes, extension)`` of ``data`` scaled to fit ``box``."""
+    try:
+        # imported here, in the worker: pages never need it
+        from PIL import Image
+    except ImportError:
+        # optional: without Pillow the proxy caches originals unresized
+        Image = None
+    if Image is None:
+        for signature, extension in _signatures:
+            if data.startswith(signature):
+                return data, extension
+        raise ValueError('not a JPEG, PNG, GIF or WebP image')
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(box)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, 'PNG', optimize=True)
+            return output.getvalue(), 'png'
+        image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+        return output.getvalue(), 'jpg'
+
+
+# ----------------------------------------------------------------------------#
+# Fetching.
+#
+# Image links are user input, so the proxy must not become a way to read
+# internal services. Every connection, including each redirect's, resolves
+# the host and connects only to an address that was checked to be public;
+# a name cannot resolve to a public address for the check and a private
+# one for the connection. Only HTTP(S) is spoken and no proxy is used.
+# ----------------------------------------------------------------------------#
+
+class NonPublicAddress(ValueError):
+    """An image host resolves to a loopback, private or otherwise internal address."""
+
+
+def is_public(ip):
+    address = ipaddress.ip_address(ip.split('%')[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def _public_connection(address, timeout, source_address=None):
+    host, port = address
+    ips = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    for ip in ips:
+        if not is_public(ip):
+            raise NonPublicAddress(f'{host} resolves to non-public address {ip}')
+    error = None
+    for ip in ips:
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req)
+
+
+def _opener(allow_private):
+    opener = urllib.request.OpenerDirector()
+    handlers = (urllib.request.HTTPHandler(), urllib.request.HTTPSHandler()) if allow_private \
+        else (_PublicHTTPHandler(), _PublicHTTPSHandler())
+    for handler in (*handlers, urllib.request.HTTPRedirectHandler(), urllib.request.HTTPDefaultErrorHandler(),
+                    urllib.request.HTTPErrorProcessor(), urllib.request.UnknownHandler()):
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch(url, timeout, max_bytes, allow_private=False):
+    """Body of ``url``, refusing non-public hosts unless ``allow_private``."""
+    request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-image-proxy'})
+    with _opener(allow_private).open(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f'{url} is larger than {max_bytes} bytes')
+    return data
+
+
+# ----------------------------------------------------------------------------#
+# Content-addressed store.
+#
+# Thumbnails live under blobs/<aa>/<sha256>.<ext>; refs/<key> names the blob
+# made for one (image_link, size). Both are plain files written atomically,
+# so every worker process shares the store. Blobs are evicted oldest-used
+# first once the store outgrows its byte budget.
+# ----------------------------------------------------------------------------#
+
+class ImageStore:
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+
+    def _blob_path(self, name):
+        return os.path.join(self.folder, 'blobs', name[:2], name)
+
+    def _ref_path(self, url, size):
+        key = hashlib.sha1(f'{size}\n{url}'.encode()).hexdigest()
+        return os.path.join(self.folder, 'refs', key[:2], key)
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def lookup(self, url, size):
+        """Blob name made for ``url`` at ``size``, if it is still stored."""
+        try:
+            with open(self._ref_path(url, size)) as ref:
+                name = ref.read().strip()
+        except OSError:
+            return None
+        return name if os.path.exists(self._blob_path(name)) else None
+
+    def put(self, url, size, data, extension):
+        name = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        path = self._blob_path(name)
+        if not os.path.exists(path):
+            self._write(path, data)
+            self._grow(len(data))
+        self._write(self._ref_path(url, size), name.encode())
+        return name
+
+    def path_of(self, name):
+        """Directory and file name of a stored blob; marks it recently used."""
+        path = self._blob_path(name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return os.path.dirname(path), os.path.basename(path)
+
+    def _blobs(self):
+        for root, _, files in os.walk(os.path.join(self.folder, 'blobs')):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _grow(self, size):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(blob_size for _, blob_size, _ in self._blobs())
+            else:
+                self._total += size
+            if self._total <= self.max_bytes:
+                return
+            # evict down to 90% so every write does not trigger a scan
+            for _, blob_size, path in sorted(self._blobs()):
+                if self._total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._total -= blob_size
+
+
+# ----------------------------------------------------------------------------#
+# Proxy.
+# ----------------------------------------------------------------------------#
+
+class ImageProxy:
+    """Serves local thumbnails of remote ``image_link`` URLs.
+
+    The ``thumbnail`` template filter returns the stored thumbnail's
+    immutable URL. When there is none yet, the filter queues the image for
+    the background worker and returns the original URL for this render.
+    The worker fetches each image once and stores every size under
+    ``IMAGE_CACHE_FOLDER``, bounded by ``IMAGE_CACHE_MAX_BYTES``. Failed
+    fetches are retried after ``IMAGE_RETRY_SECONDS``. Hosts resolving to
+    loopback, private or link-local addresses are refused unless
+    ``IMAGE_ALLOW_PRIVATE_ADDRESSES`` is set.
+    """
+
+    def __init__(self, app=None):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_PROXY_ENABLED', True)
+        if not app.config.get('IMAGE_CACHE_FOLDER'):
+            app.config['IMAGE_CACHE_FOLDER'] = os.path.join(app.instance_path, 'images')
+        app.config.setdefault('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        app.config.setdefault('IMAGE_FETCH_TIMEOUT', 5)
+        app.config.setdefault('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('IMAGE_RETRY_SECONDS', 600)
+        app.config.setdefault('IMAGE_ALLOW_PRIVATE_ADDRESSES', False)
+        app.extensions['image_proxy'] = ImageStore(app.config['IMAGE_CACHE_FOLDER'],
+                                                   app.config['IMAGE_CACHE_MAX_BYTES'])
+        app.add_url_rule('/images/<name>', 'image', self.serve)
+        app.jinja_env.filters['thumbnail'] = self.thumbnail
+
+    @property
+    def store(self):
+        return current_app.extensions['image_proxy']
+
+    def thumbnail(self, url, size='tile'):
+        if not url or not current_app.config['IMAGE_PROXY_ENABLED'] or not url.startswith(('http://', 'https://')):
+            return url
+        name = self.store.lookup(url, size)
+        if name is not None:
+            return url_for('image', name=name)
+        self.enqueue(url)
+        return url
+
+    def enqueue(self, url):
+        with self._lock:
+            if url in self._pending or self._failed.get(url, 0) > time.time():
+                return
+            self._pending.add(url)
+            if self._worker is None or not self._worker.is_alive():
+                # started lazily, so forked server workers each get their own
+                self._worker = threading.Thread(target=self._work, name='image-proxy', daemon=True,
+                                                args=(current_app._get_current_object(),))
+                self._worker.start()
+        self._queue.put(url)
+
+    def _work(self, app):
+        config = app.config
+        store = app.extensions['image_proxy']
+        while True:
+            url = self._queue.get()
+            try:
+                # one fetch makes every size
+                missing = [size for size in SIZES if store.lookup(url, size) is None]
+                if missing:
+                    data = fetch(url, config['IMAGE_FETCH_TIMEOUT'], config['IMAGE_MAX_SOURCE_BYTES'],
+                                 config['IMAGE_ALLOW_PRIVATE_ADDRESSES'])
+                    for size in missing:
+                        store.put(url, size, *make_thumbnail(data, SIZES[size]))
+            except Exception as e:
+                app.logger.warning('image proxy: %s: %s', url, e)
+                with self._lock:
+                    self._failed[url] = time.time() + config['IMAGE_RETRY_SECONDS']
+            finally:
+                with self._lock:
+                    self._pending.discard(url)
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until every queued image is processed."""
+        self._queue.join()
+
+    def serve(self, name):
+        if not _blob_name.match(name):
+            abort(404)
+        located = self.store.path_of(name)
+        if located is None:
+            abort(404)
+        # the name is the content's hash, so it never changes
+        response = send_from_directory(*located)
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
@@ -0,0 +1,256 @@
+import csv
+import io
+import json
+import os
+from datetime import timedelta
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+import areas
+import bookings
+from config import db
+from models import Venue, Artist, Show, Genre, MAX_SHOW_MINUTES
+
+
+# ----------------------------------------------------------------------------#
+# Reading.
+# ----------------------------------------------------------------------------#
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict)`` from a CSV or NDJSON stream, lazily."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_num, row if isinstance(row, dict) else None
+
+
+def to_formdata(row):
+    """Map a CSV or JSON row onto the shape a browser would POST."""
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif isinstance(value, bool):
+            if value:
+                formdata[key] = 'y'
+        else:
+            formdata[key] = str(value)
+    return formdata
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ----------------------------------------------------------------------------#
+# Importers.
+#
+# Every row is validated by the same form class as the create pages, then
+# accepted rows are written one batch per transaction.
+# ----------------------------------------------------------------------------#
+
+class Importer:
+    # name in forms.py; wtforms is only imported once an import runs
+    form_name = None
+
+    def __init__(self, rejects):
+        import forms
+        self.form_class = getattr(forms, self.form_name)
+        self.rejects = rejects
+        self.inserted = 0
+        self.rejected = 0
+
+    def reject(self, line_num, errors):
+        self.rejected += 1
+        self.rejects.write(json.dumps({'line': line_num, 'errors': errors}) + '\n')
+
+    def validate(self, batch):
+        accepted = []
+        for line_num, row in batch:
+            if row is None:
+                self.reject(line_num, {'row': ['not a JSON object']})
+                continue
+            form = self.form_class(formdata=to_formdata(row), meta={'csrf': False})
+            if form.validate():
+                accepted.append((line_num, form.data))
+            else:
+                self.reject(line_num, form.errors)
+        return accepted
+
+    def load(self, batch):
+        accepted = self.validate(batch)
+        if accepted:
+            self.insert(accepted)
+            db.session.commit()
+            self.inserted += len(accepted)
+
+    def insert(self, accepted):
+        raise NotImplementedError
+
+
+class GenreTaggedImporter(Importer):
+    model = None
+
+    def __init__(self, rejects):
+        super().__init__(rejects)
+        self.genres = {genre.name: genre for genre in Genre.query}
+
+    def insert(self, accepted):
+        # ORM inserts so that genre associations can follow the new ids;
+        # the unit of work still sends each table as one executemany.
+        for _, data in accepted:
+            genres = [self.genres[name] for name in data.pop('genres')]
+            db.session.add(self.model(genres=genres, **data))
+
+
+class VenueImporter(GenreTaggedImporter):
+    form_name = 'VenueForm'
+    model = Venue
+
+
+class ArtistImporter(GenreTaggedImporter):
+    form_name = 'ArtistForm'
+    model = Artist
+
+
+class ShowImporter(Importer):
+    form_name = 'ShowForm'
+    columns = ('artist_id', 'venue_id', 'start_time', 'duration_minutes')
+
+    def validate(self, batch):
+        accepted = []
+        for line_num, data in super().validate(batch):
+            try:
+                data['artist_id'], data['venue_id'] = int(data['artist_id']), int(data['venue_id'])
+            except (TypeError, ValueError):
+                self.reject(line_num, {'artist_id': ['must be an integer'], 'venue_id': ['must be an integer']})
+                continue
+            accepted.append((line_num, data))
+        if not accepted:
+            return accepted
+
+        # one lookup per batch instead of per row for the foreign keys
+        artist_ids = {id for id, in db.session.query(Artist.id)
+                      .filter(Artist.id.in_({data['artist_id'] for _, data in accepted}))}
+        venue_ids = {id for id, in db.session.query(Venue.id)
+                     .filter(Venue.id.in_({data['venue_id'] for _, data in accepted}))}
+        existing = []
+        for line_num, data in accepted:
+            errors = {}
+            if data['artist_id'] not in artist_ids:
+                errors['artist_id'] = ['no such artist']
+            if data['venue_id'] not in venue_ids:
+                errors['venue_id'] = ['no such venue']
+            if errors:
+                self.reject(line_num, errors)
+            else:
+                existing.append((line_num, data))
+        return self.bookable(existing)
+
+    def bookable(self, accepted):
+        """Rows overlapping neither a stored show nor an earlier row of the batch.
+
+        COPY bypasses ``bookings.book``, and on PostgreSQL one overlapping
+        row would abort the whole batch on the exclusion constraint, so the
+        batch is checked up front against the shows it could collide with.
+        """
+        if not accepted:
+            return accepted
+        starts = [data['start_time'] for _, data in accepted]
+        ends = [data['start_time'] + timedelta(minutes=data['duration_minutes']) for _, data in accepted]
+        indexes = {field: bookings.IntervalIndex() for field in bookings.CONSTRAINTS.values()}
+        for field, index in indexes.items():
+            column = getattr(Show, field)
+            rows = db.session.query(Show.id, column, Show.start_time, Show.duration_minutes) \
+                .filter(column.in_({data[field] for _, data in accepted}),
+                        Show.start_time > min(starts) - timedelta(minutes=MAX_SHOW_MINUTES),
+                        Show.start_time < max(ends))
+            for id, key, start_time, duration in rows:
+                index.add(key, start_time, start_time + timedelta(minutes=duration), id)
+
+        free = []
+        for (line_num, data), start, end in zip(accepted, starts, ends):
+            errors = {field: [str(bookings.BookingConflict(field))] for field, index in indexes.items()
+                      if index.overlapping(data[field], start, end) is not None}
+            if errors:
+                self.reject(line_num, errors)
+                continue
+            for field, index in indexes.items():
+                index.add(data[field], start, end, line_num)
+            free.append((line_num, data))
+        return free
+
+    def insert(self, accepted):
+        rows = [{column: data[column] for column in self.columns} for _, data in accepted]
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            self.copy(connection, rows)
+        else:
+            connection.execute(Show.__table__.insert(), rows)
+        # rows went in without the ORM; rebuild what the session events maintain
+        bookings.reset_on_commit(db.session)
+        areas.refresh_on_commit(db.session, set(db.session.query(Venue.state, Venue.city).filter(
+            Venue.id.in_({row['venue_id'] for row in rows}))))
+
+    def copy(self, connection, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in self.columns])
+        buffer.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY "Show" ({", ".join(self.columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter,
+}
+
+
+# ----------------------------------------------------------------------------#
+# Command.
+# ----------------------------------------------------------------------------#
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows validated and inserted per transaction.')
+@click.option('--rejects', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+              help='Where to write rejected rows as NDJSON (default: stdout).')
+@with_appcontext
+def import_command(kind, source, fmt, batch_size, rejects):
+    """Bulk-load venues, artists or shows from a CSV or NDJSON file."""
+    if fmt is None:
+        fmt = 'csv' if os.path.splitext(source.name)[1].lower() == '.csv' else 'ndjson'
+
+    importer = IMPORTERS[kind](rejects)
+    for batch in batched(read_rows(source, fmt), batch_size):
+        importer.load(batch)
+
+    click.echo(f'{kind}: {importer.inserted} inserted, {importer.rejected} rejected', err=True)
@@ -0,0 +1,130 @@
+import json
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestSQLStats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        # start times of the statements in flight, innermost last
+        self.pending = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """Statements issued at least ``threshold`` times: the N+1 suspects."""
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+
+def _request_stats():
+    return g.get('sql_stats') if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats()
+    if stats is not None:
+        stats.pending.append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats()
+    if stats is not None and stats.pending:
+        stats.record(statement, time.perf_counter() - stats.pending.pop())
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    stats = _request_stats()
+    if stats is not None and stats.pending:
+        stats.pending.pop()
+
+
+class SQLInstrumentation:
+    """Counts statements and database time per request.
+
+    Totals go out as a ``Server-Timing`` header and as one JSON log line per
+    request on the ``<app>.sql`` logger. Identical statements repeated at
+    least ``SQL_N_PLUS_ONE_THRESHOLD`` times are reported as N+1 patterns,
+    with the endpoint that issued them, at WARNING level.
+
+    The log line is written when the request is torn down, so it also
+    covers requests whose view raised. For responses streamed with
+    ``stream_with_context`` that is after the stream ends, so its totals
+    include the queries the stream ran; the header, sent first, does not.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_INSTRUMENTATION', True)
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+
+        # listening on the Engine class covers every engine, replicas included
+        if not SQLInstrumentation._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            SQLInstrumentation._listening = True
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._log)
+
+    @staticmethod
+    def _start():
+        g.sql_stats = RequestSQLStats()
+
+    @staticmethod
+    def _finish(response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+
+        total = time.perf_counter() - stats.started_at
+        response.headers.add('Server-Timing', f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total * 1000:.2f}')
+        g.sql_status = response.status_code
+        return response
+
+    @staticmethod
+    def _log(exception):
+        stats = g.pop('sql_stats', None)
+        status = g.pop('sql_status', None)
+        if stats is None:
+            return
+
+        total = time.perf_counter() - stats.started_at
+        repeated = stats.repeated(current_app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+        record = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            # no response when the exception escaped every handler
+            'status': status if status is not None else 500,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        logger = current_app.logger.getChild('sql')
+        if repeated:
+            record['n_plus_one'] = [{'statement': statement, 'count': count} for statement, count in repeated]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
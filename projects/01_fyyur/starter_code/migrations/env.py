@@ -73,6 +73,13 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.engine
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # index builds and backfills may outlast the app's statement_timeout
+            connection.execute('SET statement_timeout = 0')
+        if connection.dialect.name == 'sqlite':
+            # batch operations drop and recreate tables; with foreign keys
+            # enforced, ON DELETE CASCADE would empty the tables referencing them
+            connection.execute('PRAGMA foreign_keys=OFF')
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
@@ -80,8 +87,12 @@ def run_migrations_online():
             **current_app.extensions['migrate'].configure_args
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if connection.dialect.name == 'sqlite':
+                connection.execute('PRAGMA foreign_keys=ON')
 
 
 if context.is_offline_mode():
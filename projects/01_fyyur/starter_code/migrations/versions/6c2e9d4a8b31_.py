@@ -0,0 +1,34 @@
+"""updated_at on venues, artists and shows
+
+Revision ID: 6c2e9d4a8b31
+Revises: b8e2f0c4d713
+Create Date: 2026-10-18 18:10:44.502117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e9d4a8b31'
+down_revision = 'b8e2f0c4d713'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    # existing rows count as changed at upgrade time; SQLite cannot ALTER in
+    # a column with a non-constant default, so its tables are rebuilt
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                          server_default=sa.func.now()))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,120 @@
+"""normalize genres into an association table
+
+Revision ID: 9b3e5a7c2d14
+Revises: 4f2a9c1d7e3b
+Create Date: 2026-10-18 10:41:07.553190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5a7c2d14'
+down_revision = '4f2a9c1d7e3b'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Values of value_object.genre.Genre at the time of this revision.
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+]
+
+# (owner table, association table, owner key column)
+OWNERS = [('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')]
+
+
+def _genre_ids(connection, genre):
+    return {name: id for id, name in connection.execute(sa.select([genre.c.id, genre.c.name]))}
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for owner, association, key in OWNERS:
+        op.create_table(association,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [f'{owner}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index(f'ix_{association}_genre_id_{key}', association, ['genre_id', key])
+
+    op.bulk_insert(genre, [{'name': name} for name in GENRES])
+
+    connection = op.get_bind()
+    genre_ids = _genre_ids(connection, genre)
+    for owner, association, key in OWNERS:
+        owner_table = sa.table(owner, sa.column('id'), sa.column('genres'))
+        association_table = sa.table(association, sa.column(key), sa.column('genre_id'))
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                sa.select([owner_table.c.id, owner_table.c.genres])
+                .where(owner_table.c.id > last_id)
+                .order_by(owner_table.c.id)
+                .limit(BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            pairs = set()
+            for row in rows:
+                for name in filter(None, (name.strip() for name in (row.genres or '').split(','))):
+                    if name not in genre_ids:
+                        connection.execute(genre.insert().values(name=name))
+                        genre_ids = _genre_ids(connection, genre)
+                    pairs.add((row.id, genre_ids[name]))
+            if pairs:
+                connection.execute(association_table.insert(),
+                                   [{key: owner_id, 'genre_id': genre_id} for owner_id, genre_id in pairs])
+
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    genre = sa.table('Genre', sa.column('id'), sa.column('name'))
+    genre_names = {id: name for name, id in _genre_ids(connection, genre).items()}
+    for owner, association, key in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+        owner_table = sa.table(owner, sa.column('id'), sa.column('genres'))
+        association_table = sa.table(association, sa.column(key), sa.column('genre_id'))
+        last_id = 0
+        while True:
+            ids = [id for id, in connection.execute(
+                sa.select([owner_table.c.id])
+                .where(owner_table.c.id > last_id)
+                .order_by(owner_table.c.id)
+                .limit(BATCH_SIZE)
+            )]
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            genres = {}
+            for owner_id, genre_id in connection.execute(
+                    sa.select([association_table.c[key], association_table.c.genre_id])
+                    .where(association_table.c[key].in_(ids))):
+                genres.setdefault(owner_id, []).append(genre_names[genre_id])
+            for owner_id, names in genres.items():
+                connection.execute(owner_table.update()
+                                   .where(owner_table.c.id == owner_id)
+                                   .values(genres=','.join(sorted(names))))
+
+        op.drop_index(f'ix_{association}_genre_id_{key}', table_name=association)
+        op.drop_table(association)
+    op.drop_table('Genre')
@@ -0,0 +1,31 @@
+"""prefix indexes for name suggestions
+
+Revision ID: a7d3e5f19c42
+Revises: f4b81d2c6e97
+Create Date: 2026-10-18 16:05:52.630418
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f19c42'
+down_revision = 'f4b81d2c6e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # text_pattern_ops serves LIKE 'prefix%' under any collation; PostgreSQL
+    # only, other databases complete names from the in-process prefix index.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('Venue', 'Artist'):
+        op.execute(f'CREATE INDEX "ix_{table}_lower_name_pattern" ON "{table}" (lower(name) text_pattern_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_lower_name_pattern', table_name='Artist')
+    op.drop_index('ix_Venue_lower_name_pattern', table_name='Venue')
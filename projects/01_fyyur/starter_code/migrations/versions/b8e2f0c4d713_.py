@@ -0,0 +1,34 @@
+"""venue coordinates and geohash
+
+Revision ID: b8e2f0c4d713
+Revises: a7d3e5f19c42
+Create Date: 2026-10-18 17:40:12.318904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f0c4d713'
+down_revision = 'a7d3e5f19c42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    # byte order on PostgreSQL, so geohash prefix ranges never depend on the locale
+    op.add_column('Venue', sa.Column('geohash', sa.String(length=12).with_variant(
+        sa.String(length=12, collation='C'), 'postgresql'), nullable=True))
+    op.create_index('ix_Venue_geohash', 'Venue', ['geohash'], unique=False)
+    # existing venues get coordinates from `flask geocode-venues`
+
+
+def downgrade():
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
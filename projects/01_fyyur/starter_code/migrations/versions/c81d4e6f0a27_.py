@@ -0,0 +1,27 @@
+"""indexes for show date-range search
+
+Revision ID: c81d4e6f0a27
+Revises: 9b3e5a7c2d14
+Create Date: 2026-10-18 11:26:45.918364
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d4e6f0a27'
+down_revision = '9b3e5a7c2d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time', 'Show', ['start_time'])
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_start_time', table_name='Show')
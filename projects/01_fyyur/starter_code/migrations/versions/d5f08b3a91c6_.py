@@ -0,0 +1,31 @@
+"""row versions for ETags
+
+Revision ID: d5f08b3a91c6
+Revises: c81d4e6f0a27
+Create Date: 2026-10-18 13:02:18.447210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f08b3a91c6'
+down_revision = 'c81d4e6f0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Artist', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Show', sa.Column('version_id', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('version_id')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('version_id')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('version_id')
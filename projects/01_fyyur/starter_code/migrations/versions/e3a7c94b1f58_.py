@@ -0,0 +1,64 @@
+"""show durations and double-booking exclusion constraints
+
+Revision ID: e3a7c94b1f58
+Revises: d5f08b3a91c6
+Create Date: 2026-10-18 14:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7c94b1f58'
+down_revision = 'd5f08b3a91c6'
+branch_labels = None
+depends_on = None
+
+
+DURING = "tsrange({0}.start_time, {0}.start_time + {0}.duration_minutes * interval '1 minute')"
+
+# Overlapping pairs listed when the upgrade refuses to run.
+MAX_REPORTED = 20
+
+
+def overlapping_shows(bind, column):
+    """``(id, id, key)`` of show pairs that share ``column`` and overlap in time."""
+    return bind.execute(sa.text(
+        f'SELECT a.id, b.id, a.{column} FROM "Show" a JOIN "Show" b '
+        f'ON a.{column} = b.{column} AND a.id < b.id AND {DURING.format("a")} && {DURING.format("b")} '
+        f'ORDER BY a.id, b.id LIMIT {MAX_REPORTED + 1}'
+    )).fetchall()
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(), nullable=False, server_default='120'))
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # Exclusion constraints cannot be added NOT VALID: shows booked
+        # before this revision must be moved or deleted first (see README).
+        conflicts = {column: overlapping_shows(bind, column) for column in ('venue_id', 'artist_id')}
+        if any(conflicts.values()):
+            lines = [f'  {column} {key}: shows {first} and {second}'
+                     for column, pairs in conflicts.items() for first, second, key in pairs[:MAX_REPORTED]]
+            more = any(len(pairs) > MAX_REPORTED for pairs in conflicts.values())
+            raise RuntimeError('Overlapping shows must be resolved before the double-booking '
+                               'constraints can be added:\n' + '\n'.join(lines) + ('\n  ...' if more else ''))
+
+        # btree_gist lets the integer equality share a GiST index with the range
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for column in ('venue_id', 'artist_id'):
+            op.execute(
+                f'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{column}_during" EXCLUDE USING gist '
+                f"({column} WITH =, tsrange(start_time, start_time + duration_minutes * interval '1 minute') WITH &&)"
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('ex_Show_artist_id_during', 'Show')
+        op.drop_constraint('ex_Show_venue_id_during', 'Show')
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('duration_minutes')
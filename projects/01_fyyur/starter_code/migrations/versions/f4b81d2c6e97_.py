@@ -0,0 +1,44 @@
+"""materialized area summary for the venues page
+
+Revision ID: f4b81d2c6e97
+Revises: e3a7c94b1f58
+Create Date: 2026-10-18 15:21:09.407711
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b81d2c6e97'
+down_revision = 'e3a7c94b1f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Area',
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('venue_count', sa.Integer(), nullable=False),
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+    sa.Column('next_show_start', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('state', 'city')
+    )
+    op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'])
+
+    # first fill; afterwards areas.py refreshes the rows a write touches
+    op.execute('''
+        INSERT INTO "Area" (state, city, venue_count, upcoming_shows_count, next_show_start)
+        SELECT v.state, v.city, count(DISTINCT v.id),
+               count(s.id) FILTER (WHERE s.start_time >= CURRENT_TIMESTAMP),
+               min(s.start_time) FILTER (WHERE s.start_time >= CURRENT_TIMESTAMP)
+        FROM "Venue" v LEFT JOIN "Show" s ON s.venue_id = v.id
+        WHERE v.state IS NOT NULL AND v.city IS NOT NULL
+        GROUP BY v.state, v.city
+    ''')
+
+
+def downgrade():
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
+    op.drop_table('Area')
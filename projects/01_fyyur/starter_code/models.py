@@ -1,20 +1,96 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.orm.attributes import flag_modified
+
 from config import db
+from value_object.genre import Genre as GenreChoice
+
+# Upper bound on a show's length; range queries look back this far.
+MAX_SHOW_MINUTES = 24 * 60
 
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def lookup(cls, names):
+        if not names:
+            return []
+        return cls.query.filter(cls.name.in_(names)).order_by(cls.name).all()
+
+
+def seed_genres():
+    """Insert any value of the ``Genre`` choices missing from the table."""
+    existing = {name for name, in db.session.query(Genre.name)}
+    db.session.add_all(Genre(name=choice.value) for choice in GenreChoice if choice.value not in existing)
+    db.session.commit()
+
+
+venue_genres = db.Table(
+    'VenueGenre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_VenueGenre_genre_id_venue_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'ArtistGenre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_ArtistGenre_genre_id_artist_id', 'genre_id', 'artist_id'),
+)
+
+
+class GenreTagged:
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
+
+    @genre_names.setter
+    def genre_names(self, names):
+        # loading the current and new genres must not flush the owner's other
+        # pending edits as a separate UPDATE (and a second version bump)
+        with db.session.no_autoflush:
+            if set(names) == set(self.genre_names):
+                return
+            self.genres = Genre.lookup(names)
+        if inspect(self).persistent:
+            # association rows do not touch the owner's row; force a version bump
+            flag_modified(self, 'name')
+
+
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_start_time', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=120, server_default='120')
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    # when the row last changed, in UTC; calendar feeds derive Last-Modified from it
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now())
+
+    __mapper_args__ = {'version_id_col': version_id}
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration_minutes)
 
     @property
     def artist_name(self):
@@ -41,8 +117,24 @@ class Show(db.Model):
         return self.start_time >= datetime.today()
 
 
-class Venue(db.Model):
+# On PostgreSQL no venue or artist can hold two overlapping shows; see bookings.py.
+for _column in ('venue_id', 'artist_id'):
+    event.listen(Show.__table__, 'after_create', DDL(
+        f'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{_column}_during" EXCLUDE USING gist '
+        f"({_column} WITH =, tsrange(start_time, start_time + duration_minutes * interval '1 minute') WITH &&)"
+    ).execute_if(dialect='postgresql'))
+event.listen(Show.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+
+class Venue(GenreTagged, db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_geohash', 'geohash'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -50,13 +142,25 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venue')
+    # filled from the address by geocoding.py; geohash follows them
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # byte order on PostgreSQL, so geohash prefix ranges never depend on the locale
+    geohash = db.Column(db.String(12).with_variant(db.String(12, collation='C'), 'postgresql'))
+    # Show rows go with the venue through the FK's ON DELETE CASCADE, unloaded
+    shows = db.relationship('Show', backref='venue', passive_deletes=True)
+    genres = db.relationship('Genre', secondary=venue_genres, order_by=Genre.name)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    # when the row last changed, in UTC; calendar feeds derive Last-Modified from it
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now())
+
+    __mapper_args__ = {'version_id_col': version_id}
 
     @property
     def upcoming_shows(self):
@@ -75,21 +179,32 @@ class Venue(db.Model):
         return len(list(filter(lambda show: show.start_time < datetime.today(), self.shows)))
 
 
-class Artist(db.Model):
+class Artist(GenreTagged, db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artist')
+    # Show rows go with the artist through the FK's ON DELETE CASCADE, unloaded
+    shows = db.relationship('Show', backref='artist', passive_deletes=True)
+    genres = db.relationship('Genre', secondary=artist_genres, order_by=Genre.name)
+    version_id = db.Column(db.Integer, nullable=False, server_default='1')
+    # when the row last changed, in UTC; calendar feeds derive Last-Modified from it
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now())
+
+    __mapper_args__ = {'version_id_col': version_id}
 
     @property
     def upcoming_shows(self):
@@ -106,3 +221,31 @@ class Artist(db.Model):
     @property
     def past_shows_count(self):
         return len(list(filter(lambda show: show.start_time < datetime.today(), self.shows)))
+
+
+# The gin_trgm_ops name indexes in __table_args__ need the pg_trgm extension.
+for _table in (Venue.__table__, Artist.__table__):
+    event.listen(_table, 'before_create',
+                 DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# PostgreSQL answers name suggestions from a prefix-searchable index.
+for _table in (Venue.__table__, Artist.__table__):
+    event.listen(_table, 'after_create', DDL(
+        f'CREATE INDEX "ix_{_table.name}_lower_name_pattern" ON "{_table.name}" (lower(name) text_pattern_ops)'
+    ).execute_if(dialect='postgresql'))
+
+
+class Area(db.Model):
+    """Venue and upcoming-show counts per (state, city), kept by areas.py.
+
+    ``next_show_start`` is when ``upcoming_shows_count`` next drops, so
+    readers can tell a stale row without counting shows.
+    """
+    __tablename__ = 'Area'
+
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    venue_count = db.Column(db.Integer, nullable=False)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False)
+    next_show_start = db.Column(db.DateTime)
+
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request, url_for, abort
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+
+# ----------------------------------------------------------------------------#
+# Cursors.
+# ----------------------------------------------------------------------------#
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value
+                      for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """Turn a cursor back into key values, typed after the ``keys`` columns.
+
+    Raises ValueError if the cursor was not produced by ``encode_cursor``
+    for the same keys.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f'malformed cursor: {cursor!r}')
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError(f'malformed cursor: {cursor!r}')
+    return tuple(datetime.fromisoformat(value) if key.type.python_type is datetime else value
+                 for key, value in zip(keys, values))
+
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+# ----------------------------------------------------------------------------#
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def clamp_per_page(per_page):
+    if not per_page:
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def keyset_paginate(query, keys, key_of, after=None, before=None, per_page=None):
+    """Fetch one page of ``query`` ordered by the ``keys`` columns.
+
+    ``key_of`` maps a result row to its key values. ``after`` and ``before``
+    are cursors from a previous page; each page costs one statement that
+    seeks on the keys instead of counting past an OFFSET.
+    """
+    per_page = clamp_per_page(per_page)
+    backwards = before is not None
+    if backwards:
+        query = query.filter(tuple_(*keys) < decode_cursor(before, keys)) \
+            .order_by(*[key.desc() for key in keys])
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*keys) > decode_cursor(after, keys))
+        query = query.order_by(*keys)
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    first, last = encode_cursor(key_of(rows[0])), encode_cursor(key_of(rows[-1]))
+    if backwards:
+        return KeysetPage(rows, next_cursor=last, prev_cursor=first if has_more else None)
+    return KeysetPage(rows, next_cursor=last if has_more else None,
+                      prev_cursor=first if after is not None else None)
+
+
+def paginate_request(query, keys, key_of):
+    """``keyset_paginate`` driven by the ``after``/``before``/``per_page`` args."""
+    try:
+        return keyset_paginate(query, keys, key_of,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'),
+                               per_page=request.args.get('per_page', type=int))
+    except ValueError:
+        abort(400)
+
+
+def page_url(**cursor):
+    """URL of the current listing with its cursor replaced by ``cursor``.
+
+    Fields of a POSTed search become query arguments, so the link repeats it.
+    """
+    args = request.values.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(cursor)
+    return url_for(request.endpoint, **request.view_args, **args)
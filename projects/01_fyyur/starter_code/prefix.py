@@ -0,0 +1,90 @@
+import bisect
+import re
+import threading
+
+_word_start = re.compile(r'\b\w')
+
+
+def word_suffixes(name):
+    """``name`` lowercased from the start of each word: "the musical hop", "musical hop", "hop"."""
+    lowered = name.lower()
+    return [lowered[match.start():] for match in _word_start.finditer(lowered)]
+
+
+class PrefixIndex:
+    """Sorted word suffixes of names, for type-ahead completion.
+
+    Whole names and the suffixes starting at their later words are kept in
+    two sorted lists, so "hop" also finds "The Musical Hop". A lookup
+    bisects to the prefix and reads at most ``limit`` entries forward, which
+    keeps answers in microseconds however many names are indexed.
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._leading = []
+        self._inner = []
+        for key, name in rows:
+            if name is not None:
+                self._names[key] = name
+                suffixes = word_suffixes(name) or [name.lower()]
+                self._leading.append((suffixes[0], key))
+                self._inner.extend((suffix, key) for suffix in suffixes[1:])
+        self._leading.sort()
+        self._inner.sort()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, name):
+        with self._lock:
+            self._discard(key)
+            if name is None:
+                return
+            self._names[key] = name
+            for entries, suffix in self._entries_of(name):
+                bisect.insort(entries, (suffix, key))
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _entries_of(self, name):
+        suffixes = word_suffixes(name) or [name.lower()]
+        yield self._leading, suffixes[0]
+        for suffix in suffixes[1:]:
+            yield self._inner, suffix
+
+    def _discard(self, key):
+        name = self._names.pop(key, None)
+        if name is None:
+            return
+        for entries, suffix in self._entries_of(name):
+            position = bisect.bisect_left(entries, (suffix, key))
+            if position < len(entries) and entries[position] == (suffix, key):
+                del entries[position]
+
+    def complete(self, prefix, limit=10):
+        """Up to ``limit`` ``(key, name)`` pairs with a word starting with ``prefix``.
+
+        Names starting with the prefix come first, then names with a later
+        word starting with it, each in alphabetical order of the match.
+        """
+        prefix = prefix.lower().strip()
+        if not prefix or limit <= 0:
+            return []
+        matches = []
+        seen = set()
+        with self._lock:
+            for entries in (self._leading, self._inner):
+                position = bisect.bisect_left(entries, (prefix,))
+                while position < len(entries) and len(matches) < limit:
+                    suffix, key = entries[position]
+                    if not suffix.startswith(prefix):
+                        break
+                    position += 1
+                    if key not in seen:
+                        seen.add(key)
+                        matches.append((key, self._names[key]))
+        return matches
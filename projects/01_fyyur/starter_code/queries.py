@@ -0,0 +1,252 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+
+from config import db
+from geohash import covering_cells, haversine_miles, successor
+from models import Venue, Artist, Show, Genre, venue_genres, artist_genres
+import search_index
+
+
+# ----------------------------------------------------------------------------#
+# Show counts.
+# ----------------------------------------------------------------------------#
+
+def _with_show_counts(model, foreign_key, now=None):
+    """Query ``model`` rows annotated with upcoming and past show counts.
+
+    Both counts come from one grouped statement, so callers can keep
+    chaining filters and orderings without loading ``model.shows``.
+    """
+    if now is None:
+        now = datetime.today()
+    upcoming = func.count(Show.id).filter(Show.start_time >= now)
+    past = func.count(Show.id).filter(Show.start_time < now)
+    return db.session.query(model,
+                            upcoming.label('upcoming_shows_count'),
+                            past.label('past_shows_count')) \
+        .outerjoin(Show, foreign_key == model.id) \
+        .group_by(model.id)
+
+
+def venues_with_show_counts(now=None):
+    return _with_show_counts(Venue, Show.venue_id, now)
+
+
+def artists_with_show_counts(now=None):
+    return _with_show_counts(Artist, Show.artist_id, now)
+
+
+def genre_names_by_owner(model, ids):
+    """``{owner id: [genre name, ...]}`` for many venues or artists in one query."""
+    association = venue_genres if model is Venue else artist_genres
+    owner_key = association.c.venue_id if model is Venue else association.c.artist_id
+    names = {id: [] for id in ids}
+    if not ids:
+        return names
+    rows = db.session.query(owner_key, Genre.name) \
+        .join(Genre, Genre.id == association.c.genre_id) \
+        .filter(owner_key.in_(ids)) \
+        .order_by(Genre.name)
+    for owner_id, name in rows:
+        names[owner_id].append(name)
+    return names
+
+
+def next_show_start(now=None):
+    """Start of the next upcoming show, when some count flips to past."""
+    if now is None:
+        now = datetime.today()
+    return db.session.query(func.min(Show.start_time)).filter(Show.start_time >= now).scalar()
+
+
+# ----------------------------------------------------------------------------#
+# Name search.
+# ----------------------------------------------------------------------------#
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _matching(query, model, term):
+    """Rows of ``query`` whose ``model.name`` contains ``term``, best match first.
+
+    PostgreSQL answers from the pg_trgm GIN index on ``name``; other
+    databases go through the in-process trigram index.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return query \
+            .filter(model.name.ilike(f'%{_escape_like(term)}%', escape='\\')) \
+            .order_by(func.similarity(model.name, term).desc(), model.name) \
+            .all()
+
+    ranked_ids = search_index.name_index(model).search(term)
+    if not ranked_ids:
+        return []
+    rank = {key: position for position, key in enumerate(ranked_ids)}
+    rows = query.filter(model.id.in_(ranked_ids)).all()
+    return sorted(rows, key=lambda row: rank[row[0].id])
+
+
+def _suggestions(model, prefix, limit):
+    """Up to ``limit`` ``(id, name)`` pairs for a type-ahead ``prefix``.
+
+    Names starting with the prefix come first, then names with a later word
+    starting with it, as in the in-process prefix index used off PostgreSQL.
+    PostgreSQL walks the ``lower(name) text_pattern_ops`` index for the
+    first, and only looks for the second when the first leave room; those
+    are ordered by the name from the matching word on.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        lowered = func.lower(model.name)
+        leading = lowered.like(f'{_escape_like(prefix.lower())}%', escape='\\')
+        matches = db.session.query(model.id, model.name) \
+            .filter(leading) \
+            .order_by(lowered, model.id) \
+            .limit(limit) \
+            .all()
+        if len(matches) < limit:
+            # \m is a word start; ~* can use the trigram index on name
+            word = r'\m' + re.escape(prefix.lower())
+            matches += db.session.query(model.id, model.name) \
+                .filter(model.name.op('~*')(word), ~leading) \
+                .order_by(func.substring(lowered, word + '.*$'), model.id) \
+                .limit(limit - len(matches)) \
+                .all()
+        return matches
+    return search_index.prefix_index(model).complete(prefix, limit)
+
+
+def venue_suggestions(prefix, limit=10):
+    return _suggestions(Venue, prefix, limit)
+
+
+def artist_suggestions(prefix, limit=10):
+    return _suggestions(Artist, prefix, limit)
+
+
+def venues_matching(term, now=None):
+    return _matching(venues_with_show_counts(now), Venue, term)
+
+
+def artists_matching(term, now=None):
+    return _matching(artists_with_show_counts(now), Artist, term)
+
+
+# ----------------------------------------------------------------------------#
+# Show search.
+# ----------------------------------------------------------------------------#
+
+def shows_between(start=None, end=None, venue_id=None, artist_id=None):
+    """Shows with ``start <= start_time < end``, artist and venue loaded.
+
+    The bounds are compared against the raw column so that the
+    ``(start_time)``, ``(venue_id, start_time)`` and ``(artist_id, start_time)``
+    indexes apply.
+    """
+    query = Show.query.join(Show.artist).join(Show.venue) \
+        .options(contains_eager(Show.artist), contains_eager(Show.venue))
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    return query.order_by(Show.start_time, Show.id)
+
+
+# ----------------------------------------------------------------------------#
+# Nearby venues.
+# ----------------------------------------------------------------------------#
+
+def _in_cells(cells):
+    # sorted cells that follow each other share one range scan
+    spans = []
+    for cell in cells:
+        if spans and spans[-1][1] == cell:
+            spans[-1][1] = successor(cell)
+        else:
+            spans.append([cell, successor(cell)])
+    return or_(*(Venue.geohash >= lower if upper is None else and_(Venue.geohash >= lower, Venue.geohash < upper)
+                 for lower, upper in spans))
+
+
+def venues_near(latitude, longitude, radius_miles, limit=50, now=None):
+    """The ``limit`` nearest venues within the radius, with show counts.
+
+    Rows are ``(venue, upcoming_shows_count, past_shows_count, miles)``.
+    Candidates come from range scans of the ``geohash`` index over the cells
+    covering the circle. Exact haversine distances then drop the corners,
+    and only the venues kept are counted.
+    """
+    candidates = db.session.query(Venue.id, Venue.latitude, Venue.longitude).filter(Venue.geohash.isnot(None))
+    cells = covering_cells(latitude, longitude, radius_miles)
+    if cells is not None:
+        candidates = candidates.filter(_in_cells(cells))
+
+    distances = {}
+    for id, venue_latitude, venue_longitude in candidates:
+        miles = haversine_miles(latitude, longitude, venue_latitude, venue_longitude)
+        if miles <= radius_miles:
+            distances[id] = miles
+    nearest = sorted(distances, key=lambda id: (distances[id], id))[:limit]
+    if not nearest:
+        return []
+    rows = venues_with_show_counts(now).filter(Venue.id.in_(nearest)).all()
+    return sorted(((venue, upcoming, past, distances[venue.id]) for venue, upcoming, past in rows),
+                  key=lambda row: (row[3], row[0].id))
+
+
+# ----------------------------------------------------------------------------#
+# Detail pages.
+# ----------------------------------------------------------------------------#
+
+class DetailView:
+    """A venue or artist whose shows are already split around one ``now``.
+
+    Attribute access falls through to the wrapped model, so templates can
+    keep using ``venue.name`` alongside ``venue.upcoming_shows``.
+    """
+
+    def __init__(self, entity, now):
+        self.entity = entity
+        self.now = now
+        shows = sorted(entity.shows, key=lambda show: show.start_time)
+        self.upcoming_shows = [show for show in shows if show.start_time >= now]
+        self.past_shows = [show for show in shows if show.start_time < now]
+        self.upcoming_shows_count = len(self.upcoming_shows)
+        self.past_shows_count = len(self.past_shows)
+
+    @property
+    def next_rollover(self):
+        return self.upcoming_shows[0].start_time if self.upcoming_shows else None
+
+    def __getattr__(self, name):
+        return getattr(self.entity, name)
+
+
+def _load_detail(model, counterpart, entity_id, now=None):
+    if now is None:
+        now = datetime.today()
+    entity = model.query \
+        .options(joinedload(model.shows).joinedload(counterpart), selectinload(model.genres)) \
+        .filter(model.id == entity_id) \
+        .one_or_none()
+    if entity is None:
+        return None
+    return DetailView(entity, now)
+
+
+def load_venue_detail(venue_id, now=None):
+    return _load_detail(Venue, Show.artist, venue_id, now)
+
+
+def load_artist_detail(artist_id, now=None):
+    return _load_detail(Artist, Show.venue, artist_id, now)
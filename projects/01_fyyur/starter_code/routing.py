@@ -0,0 +1,75 @@
+import itertools
+import time
+
+from flask import g, has_request_context, request, session as http_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Cookie-session key holding the time until which this client reads from
+# the primary, so a redirect after a write never sees replication lag.
+READ_PRIMARY_UNTIL = '_read_primary_until'
+
+_next_replica = itertools.count()
+
+
+def replica_binds(config):
+    return [f'replica_{index}' for index in range(len(config.get('SQLALCHEMY_REPLICA_URIS', ())))]
+
+
+class RoutingSession(SignallingSession):
+    """Sends the reads of read-only requests to a replica.
+
+    Writes, flushes, CLI commands and anything after this session or this
+    client recently wrote stay on the primary. Each session sticks to one
+    replica so a request sees a single consistent snapshot.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._reads_from_replica(mapper):
+            return super().get_bind(mapper, clause)
+        bind = self.info.get('replica_bind')
+        if bind is None:
+            binds = replica_binds(self.app.config)
+            bind = self.info['replica_bind'] = binds[next(_next_replica) % len(binds)]
+        # the response cache will not keep what a lagging replica rendered
+        g.read_from_replica = True
+        return self.db.get_engine(self.app, bind=bind)
+
+    def _reads_from_replica(self, mapper):
+        if not self.app.config.get('SQLALCHEMY_REPLICA_URIS'):
+            return False
+        if self._flushing or self.info.get('wrote'):
+            return False
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key') is not None:
+            return False
+        if not has_request_context() or request.method not in READ_ONLY_METHODS:
+            return False
+        return http_session.get(READ_PRIMARY_UNTIL, 0) <= time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_bulk_update')
+@event.listens_for(RoutingSession, 'after_bulk_delete')
+def _mark_bulk_written(context):
+    context.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    if session.info.get('wrote') and has_request_context() and session.app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        http_session[READ_PRIMARY_UNTIL] = time.time() + session.app.config['REPLICA_LAG_SECONDS']
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
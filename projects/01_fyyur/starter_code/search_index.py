@@ -0,0 +1,92 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import db
+from models import Venue, Artist
+from prefix import PrefixIndex
+from trigram import TrigramIndex
+
+
+# ----------------------------------------------------------------------------#
+# In-process name indexes.
+#
+# Databases without pg_trgm (SQLite in development and tests) search names
+# through the trigram indexes; every database completes names through the
+# prefix indexes. They are built lazily from the table and then kept
+# current from committed sessions, so neither ever scans the table.
+# ----------------------------------------------------------------------------#
+
+INDEXED_MODELS = (Venue, Artist)
+
+_lock = threading.Lock()
+_indexes = {}
+
+_PENDING = 'search_index_pending'
+
+
+def _index(kind, model):
+    index = _indexes.get((kind, model))
+    if index is None:
+        with _lock:
+            index = _indexes.get((kind, model))
+            if index is None:
+                index = kind(db.session.query(model.id, model.name))
+                _indexes[kind, model] = index
+    return index
+
+
+def name_index(model):
+    return _index(TrigramIndex, model)
+
+
+def prefix_index(model):
+    return _index(PrefixIndex, model)
+
+
+def reset(model=None):
+    with _lock:
+        for kind, indexed in list(_indexes):
+            if model is None or indexed is model:
+                del _indexes[kind, indexed]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING, [])
+    for obj in session.new | session.dirty:
+        if isinstance(obj, INDEXED_MODELS):
+            pending.append((type(obj), obj.id, obj.name))
+    for obj in session.deleted:
+        if isinstance(obj, INDEXED_MODELS):
+            pending.append((type(obj), obj.id, None))
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _collect_bulk_delete(delete_context):
+    # the deleted ids are unknown here; rebuild the index on next use
+    model = delete_context.mapper.class_
+    if model in INDEXED_MODELS:
+        delete_context.session.info.setdefault(_PENDING, []).append((model, None, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for model, key, name in session.info.pop(_PENDING, ()):
+        if key is None:
+            reset(model)
+            continue
+        for kind in (TrigramIndex, PrefixIndex):
+            index = _indexes.get((kind, model))
+            if index is None:
+                continue
+            if name is None:
+                index.discard(key)
+            else:
+                index.add(key, name)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
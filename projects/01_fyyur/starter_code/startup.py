@@ -0,0 +1,155 @@
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.local import LocalProxy
+
+
+# ----------------------------------------------------------------------------#
+# Deferred extensions.
+#
+# Flask-Migrate pulls in alembic and Flask-Moment pulls in distutils; a
+# worker serving pages needs neither. These stand-ins register the same
+# names and import the real extension the first time it is used.
+# ----------------------------------------------------------------------------#
+
+class LazyMigrate:
+    """Flask-Migrate, imported when a ``flask db`` command first needs it."""
+
+    def __init__(self, directory='migrations', **kwargs):
+        self.directory = directory
+        self.kwargs = kwargs
+
+    def init_app(self, app, db):
+        app.extensions['migrate'] = _PendingMigrate(app, db, self.directory, self.kwargs)
+
+
+class _PendingMigrate:
+    def __init__(self, app, db, directory, kwargs):
+        self._setup = (app, db, directory, kwargs)
+
+    def __getattr__(self, name):
+        from flask_migrate import Migrate
+        app, db, directory, kwargs = self._setup
+        # replaces this stand-in in app.extensions['migrate']
+        Migrate(app, db, directory, **kwargs)
+        return getattr(app.extensions['migrate'], name)
+
+
+def _moment():
+    from flask_moment import _moment
+    return _moment
+
+
+class LazyMoment:
+    """Flask-Moment's ``moment`` template global, imported on first use."""
+
+    def init_app(self, app):
+        app.jinja_env.globals['moment'] = LocalProxy(_moment)
+
+
+# ----------------------------------------------------------------------------#
+# Measuring.
+#
+# Both measurements run in a fresh interpreter: by the time a command runs
+# in this process everything is imported already.
+# ----------------------------------------------------------------------------#
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+_FIRST_RESPONSE = '''
+import json, time
+started = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+response = target.app.test_client().get({path!r})
+finished = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (finished - imported) * 1000,
+    'status': response.status_code,
+}}))
+'''
+
+
+def import_times(module, cwd=None):
+    """``(name, depth, self_ms, cumulative_ms)`` for everything importing ``module`` loads."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            entries.append((name, len(indent) // 2, int(own) / 1000, int(cumulative) / 1000))
+    return entries
+
+
+def direct_imports(entries, module):
+    """Entries imported by ``module`` itself, heaviest first.
+
+    ``-X importtime`` lists a module after everything it imported, one
+    level deeper, so those are the depth-1 lines just before it.
+    """
+    for index, (name, depth, _, _) in enumerate(entries):
+        if name == module and depth == 0:
+            break
+    else:
+        return []
+    children = []
+    for entry in reversed(entries[:index]):
+        if entry[1] == 0:
+            break
+        if entry[1] == 1:
+            children.append(entry)
+    return sorted(children, key=lambda entry: -entry[3])
+
+
+def package_times(entries):
+    """Own import time summed per top-level package, heaviest first."""
+    totals = Counter()
+    for name, _, own, _ in entries:
+        totals[name.split('.')[0]] += own
+    return totals.most_common()
+
+
+def cold_start(module, path='/', cwd=None):
+    """Timings of one fresh process importing ``module`` and serving ``path``."""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', _FIRST_RESPONSE.format(module=module, path=path)],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+# ----------------------------------------------------------------------------#
+# Command.
+# ----------------------------------------------------------------------------#
+
+@click.command('startup-report')
+@click.option('--module', default='app', show_default=True, help='Module that creates ``app``.')
+@click.option('--path', default='/', show_default=True, help='Path of the first request.')
+@click.option('--top', default=15, show_default=True, help='Rows per table.')
+@with_appcontext
+def startup_report_command(module, path, top):
+    """Show where a fresh worker spends its time before the first response."""
+    cwd = current_app.root_path
+    timings = cold_start(module, path, cwd)
+    click.echo(f'process start to first response: {timings["process_ms"]:.0f} ms')
+    click.echo(f'  import {module}: {timings["import_ms"]:.0f} ms')
+    click.echo(f'  first response ({path}, {timings["status"]}): {timings["first_response_ms"]:.0f} ms')
+
+    entries = import_times(module, cwd)
+    click.echo(f'\nimported by {module} (cumulative ms)')
+    for name, _, _, cumulative in direct_imports(entries, module)[:top]:
+        click.echo(f'  {cumulative:8.1f}  {name}')
+    click.echo('\nheaviest packages (own ms)')
+    for name, own in package_times(entries)[:top]:
+        click.echo(f'  {own:8.1f}  {name}')
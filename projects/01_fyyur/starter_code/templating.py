@@ -0,0 +1,79 @@
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from cache import LRUCache
+
+
+# ----------------------------------------------------------------------------#
+# Fragment cache.
+# ----------------------------------------------------------------------------#
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, ... %}...{% endcache %}`` keeps rendered markup.
+
+    The key is the listed values plus the template name and line, so the
+    same entity can be cached differently in two templates. Keys should
+    hold the ``version_id`` of everything the block displays: a write bumps
+    it and the old fragment is simply never asked for again.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [nodes.Const(parser.name), nodes.Const(lineno), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.Tuple(key, 'load')])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(key, fragment)
+        return fragment
+
+
+# ----------------------------------------------------------------------------#
+# Extension.
+# ----------------------------------------------------------------------------#
+
+class TemplateCache:
+    """Compiled templates on disk and rendered fragments in memory.
+
+    Compiled templates go to ``JINJA_BYTECODE_CACHE_FOLDER`` (default
+    ``instance/jinja``), so a fresh worker loads them instead of compiling.
+    Fragments live in an ``LRUCache`` sized by ``FRAGMENT_CACHE_SIZE``. Their
+    ``FRAGMENT_CACHE_TTL`` also bounds how long a tile keeps an image link
+    after its thumbnail is ready.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', 4096)
+        app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+        if not app.config.get('JINJA_BYTECODE_CACHE_FOLDER'):
+            app.config['JINJA_BYTECODE_CACHE_FOLDER'] = os.path.join(app.instance_path, 'jinja')
+
+        folder = app.config['JINJA_BYTECODE_CACHE_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(folder)
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        if app.config['FRAGMENT_CACHE_ENABLED']:
+            app.jinja_env.fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'],
+                                                    app.config['FRAGMENT_CACHE_TTL'])
@@ -0,0 +1,171 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import bookings
+from app import app
+from bookings import BookingConflict, IntervalIndex, book
+from config import db, engine_options
+from importer import ShowImporter
+from models import Venue, Artist, Show
+
+NOON = datetime(2030, 1, 1, 12)
+
+
+def at(hours, minutes=0):
+    return NOON + timedelta(hours=hours, minutes=minutes)
+
+
+class IntervalIndexTestCase(unittest.TestCase):
+    """This class represents the interval index test case"""
+
+    def setUp(self):
+        self.index = IntervalIndex()
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.index.add(1, at(0), at(2), 'a')
+
+        self.assertIsNone(self.index.overlapping(1, at(2), at(3)))
+        self.assertIsNone(self.index.overlapping(1, at(-1), at(0)))
+        self.assertEqual(self.index.overlapping(1, at(1, 59), at(3)), 'a')
+        self.assertEqual(self.index.overlapping(1, at(-1), at(0, 1)), 'a')
+        self.assertEqual(self.index.overlapping(1, at(0, 30), at(1)), 'a')
+        self.assertIsNone(self.index.overlapping(2, at(0), at(2)))
+
+    def test_overlapping_stored_intervals_are_still_found(self):
+        # legacy rows were never checked: [-2, 2) hides behind [-1, 0)
+        self.index.add(1, at(-2), at(2), 'long')
+        self.index.add(1, at(-1), at(0), 'short')
+
+        self.assertEqual(self.index.overlapping(1, at(1), at(1, 30)), 'long')
+        self.assertIsNone(self.index.overlapping(1, at(2), at(3)))
+
+    def test_discarded_intervals_free_their_slot(self):
+        for hour in range(100):
+            self.index.add(1, at(hour), at(hour + 1), hour)
+        self.index.discard(50)
+        self.index.discard(999)
+
+        self.assertIsNone(self.index.overlapping(1, at(50), at(51)))
+        self.assertEqual(self.index.overlapping(1, at(50), at(52)), 51)
+        self.assertEqual(self.index.overlapping(1, at(49, 30), at(50, 30)), 49)
+
+    def test_matches_a_linear_scan(self):
+        intervals = [(at(hour * 7 % 50), at(hour * 7 % 50 + hour % 5 + 1)) for hour in range(200)]
+        for id, (start, end) in enumerate(intervals):
+            self.index.add(1, start, end, id)
+        for id in range(0, 200, 3):
+            self.index.discard(id)
+        kept = [(id, interval) for id, interval in enumerate(intervals) if id % 3]
+
+        for hour in range(-2, 60):
+            for length in (1, 3):
+                start, end = at(hour), at(hour + length)
+                expected = {id for id, (s, e) in kept if s < end and e > start}
+                found = self.index.overlapping(1, start, end)
+                if expected:
+                    self.assertIn(found, expected)
+                else:
+                    self.assertIsNone(found)
+
+
+class BookingTestCase(unittest.TestCase):
+    """This class represents the booking test case"""
+
+    def setUp(self):
+        """Bind the app to an empty SQLite database with two venues and two artists."""
+        self.folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.folder, 'fyyur.db')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + self.database_path
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        bookings.reset()
+        for number in (1, 2):
+            db.session.add(Venue(id=number, name=f'Venue {number}', city='San Francisco', state='CA'))
+            db.session.add(Artist(id=number, name=f'Artist {number}', city='San Francisco', state='CA'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Drop the database and forget its bookings."""
+        db.session.remove()
+        db.drop_all()
+        bookings.reset()
+        self.context.pop()
+        os.remove(self.database_path)
+        os.rmdir(self.folder)
+
+    def book(self, venue_id, artist_id, start, minutes=60):
+        show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start, duration_minutes=minutes)
+        book(show)
+        return show.id
+
+    def test_venue_and_artist_conflicts_are_told_apart(self):
+        self.book(1, 1, at(0))
+
+        with self.assertRaises(BookingConflict) as venue:
+            self.book(1, 2, at(0, 30))
+        with self.assertRaises(BookingConflict) as artist:
+            self.book(2, 1, at(0, 30))
+        self.assertEqual(venue.exception.field, 'venue_id')
+        self.assertEqual(artist.exception.field, 'artist_id')
+
+        self.book(1, 2, at(1))
+        self.assertEqual(Show.query.count(), 2)
+
+    def test_legacy_overlaps_do_not_hide_conflicts(self):
+        # rows written before the check existed may already overlap
+        db.session.add_all([Show(venue_id=1, artist_id=1, start_time=at(-2), duration_minutes=240),
+                            Show(venue_id=1, artist_id=2, start_time=at(-1), duration_minutes=60)])
+        db.session.commit()
+        bookings.reset()
+
+        with self.assertRaises(BookingConflict):
+            self.book(1, 2, at(1), 30)
+
+    def test_edited_and_deleted_shows_are_rechecked(self):
+        moved = self.book(1, 1, at(0))
+        deleted = self.book(1, 1, at(2))
+
+        show = Show.query.get(moved)
+        show.start_time = at(4)
+        db.session.commit()
+        db.session.delete(Show.query.get(deleted))
+        db.session.commit()
+
+        self.book(1, 2, at(0))
+        self.book(1, 2, at(2))
+        with self.assertRaises(BookingConflict):
+            self.book(1, 2, at(4, 30))
+
+    def test_importer_rejects_overlapping_rows(self):
+        self.book(1, 1, at(0))
+        rows = [
+            {'venue_id': 1, 'artist_id': 2, 'start_time': '2030-01-01 12:30:00'},
+            {'venue_id': 2, 'artist_id': 2, 'start_time': '2030-01-01 14:00:00'},
+            {'venue_id': 2, 'artist_id': 1, 'start_time': '2030-01-01 14:30:00'},
+            {'venue_id': 1, 'artist_id': 2, 'start_time': '2030-01-01 16:00:00'},
+        ]
+        rejects = io.StringIO()
+        importer = ShowImporter(rejects)
+
+        with app.test_request_context():
+            importer.load(list(enumerate(rows, start=1)))
+
+        rejected = [json.loads(line) for line in rejects.getvalue().splitlines()]
+        self.assertEqual([reject['line'] for reject in rejected], [1, 3])
+        self.assertEqual(list(rejected[0]['errors']), ['venue_id'])
+        self.assertEqual(list(rejected[1]['errors']), ['venue_id'])
+        self.assertEqual((importer.inserted, importer.rejected), (2, 2))
+        self.assertEqual(Show.query.count(), 3)
+        with self.assertRaises(BookingConflict):
+            self.book(1, 1, at(4, 30))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask import Flask, g
+
+import cache
+from cache import LRUCache, ResponseCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """This class represents the tagged LRU cache test case"""
+
+    def test_invalidate_drops_exactly_the_tagged_entries(self):
+        lru = LRUCache()
+        lru.set('venues', 1, tags={'venues'})
+        lru.set('venue 1', 2, tags={'venue:1', 'artist:3'})
+        lru.set('venue 2', 3, tags={'venue:2'})
+
+        lru.invalidate('artist:3', 'artist:4')
+
+        self.assertIsNone(lru.get('venue 1'))
+        self.assertEqual((lru.get('venues'), lru.get('venue 2')), (1, 3))
+        self.assertNotIn('venue:1', lru._tags)
+
+    def test_least_recently_used_entries_go_first(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1, tags={'x'})
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        self.assertEqual(len(lru), 2)
+
+    def test_entries_expire_at_the_earlier_of_ttl_and_their_own_time(self):
+        lru = LRUCache(ttl=60)
+        with mock.patch.object(cache.time, 'time', return_value=1000):
+            lru.set('ttl', 1)
+            lru.set('own', 2, expires_at=1010)
+        with mock.patch.object(cache.time, 'time', return_value=1030):
+            self.assertEqual((lru.get('ttl'), lru.get('own')), (1, None))
+        with mock.patch.object(cache.time, 'time', return_value=1060):
+            self.assertIsNone(lru.get('ttl'))
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """This class represents the response cache test case"""
+
+    def setUp(self):
+        """Build an app with one cached view that counts its renders."""
+        self.app = Flask(__name__)
+        self.app.config.update(SECRET_KEY='test', REPLICA_LAG_SECONDS=10)
+        self.cache = ResponseCache(self.app)
+        self.renders = []
+        self.replica = False
+
+        @self.app.before_request
+        def route():
+            g.read_from_replica = self.replica
+
+        @self.app.route('/venues/<int:venue_id>')
+        @self.cache.cached('venue:{venue_id}')
+        def venue(venue_id):
+            self.renders.append(venue_id)
+            self.cache.tag(f'artist:{venue_id * 10}')
+            self.cache.expire_at(datetime.now() + timedelta(hours=1))
+            return f'venue {venue_id} render {len(self.renders)}'
+
+        self.client = self.app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).get_data(as_text=True)
+
+    def invalidate(self, *tags):
+        with self.app.app_context():
+            self.cache.invalidate(*tags)
+
+    def test_pages_are_rendered_once_until_a_tag_is_invalidated(self):
+        first = self.get('/venues/1')
+        self.get('/venues/2')
+
+        self.assertEqual(self.get('/venues/1'), first)
+        self.invalidate('venue:1')
+        self.assertNotEqual(self.get('/venues/1'), first)
+        self.get('/venues/2')
+        self.assertEqual(self.renders, [1, 2, 1])
+
+    def test_tags_added_while_rendering_invalidate_the_page(self):
+        self.get('/venues/1')
+        self.invalidate('artist:20')
+        self.get('/venues/1')
+        self.invalidate('artist:10')
+        self.get('/venues/1')
+
+        self.assertEqual(self.renders, [1, 1])
+
+    def test_query_strings_are_part_of_the_key(self):
+        self.get('/venues/1?a=1&b=2')
+        self.get('/venues/1?b=2&a=1')
+        self.get('/venues/1?a=2')
+
+        self.assertEqual(self.renders, [1, 1])
+
+    def test_disabled_cache_renders_every_time(self):
+        self.app.config['RESPONSE_CACHE_ENABLED'] = False
+        self.get('/venues/1')
+        self.get('/venues/1')
+
+        self.assertEqual(self.renders, [1, 1])
+
+    def test_replica_pages_are_not_kept_right_after_a_write(self):
+        self.invalidate('venue:1')
+        self.replica = True
+        self.get('/venues/1')
+        self.get('/venues/1')
+        self.get('/venues/2')
+        self.get('/venues/2')
+
+        self.assertEqual(self.renders, [1, 1, 2])
+        with mock.patch.object(cache.time, 'time', return_value=cache.time.time() + 11):
+            self.get('/venues/1')
+            self.get('/venues/1')
+        self.assertEqual(self.renders, [1, 1, 2, 1])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import base64
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import images
+from images import ImageProxy, ImageStore, NonPublicAddress, fetch, is_public
+
+# A 1x1 PNG, small enough to inline and valid with or without Pillow.
+PIXEL = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg==')
+
+
+class Origin(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for an image host: /pixel.png, and /redirect?<url>."""
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path == '/pixel.png':
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(PIXEL)))
+            self.end_headers()
+            self.wfile.write(PIXEL)
+        elif self.path.startswith('/redirect?'):
+            self.send_response(302)
+            self.send_header('Location', self.path.split('?', 1)[1])
+            self.end_headers()
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageProxyTestCase(unittest.TestCase):
+    """This class represents the image proxy test case"""
+
+    def setUp(self):
+        """Start a local origin and an app with an empty thumbnail store."""
+        self.origin = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+        self.origin.hits = []
+        threading.Thread(target=self.origin.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.origin.server_port}'
+
+        self.folder = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config['IMAGE_CACHE_FOLDER'] = self.folder
+        self.proxy = ImageProxy(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """Stop the origin and remove the store."""
+        self.origin.shutdown()
+        self.origin.server_close()
+        shutil.rmtree(self.folder)
+
+    def thumbnail(self, url, size='tile'):
+        with self.app.test_request_context():
+            return self.proxy.thumbnail(url, size)
+
+    def test_thumbnails_are_fetched_once_and_served_immutable(self):
+        self.app.config['IMAGE_ALLOW_PRIVATE_ADDRESSES'] = True
+        url = self.base + '/pixel.png'
+
+        self.assertEqual(self.thumbnail(url), url)
+        self.proxy.join()
+        tile, detail = self.thumbnail(url), self.thumbnail(url, 'detail')
+
+        self.assertRegex(tile, r'^/images/[0-9a-f]{64}\.(png|jpg)$')
+        self.assertRegex(detail, r'^/images/[0-9a-f]{64}\.(png|jpg)$')
+        self.assertEqual(self.origin.hits, ['/pixel.png'])
+        with self.client.get(tile) as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Cache-Control'], images.IMMUTABLE)
+
+    def test_unknown_blobs_are_not_found(self):
+        self.assertEqual(self.client.get('/images/' + 'a' * 64 + '.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/images/..%2F..%2Fetc%2Fpasswd').status_code, 404)
+
+    def test_private_hosts_are_refused(self):
+        url = self.base + '/pixel.png'
+
+        self.assertEqual(self.thumbnail(url), url)
+        self.proxy.join()
+
+        self.assertEqual(self.thumbnail(url), url)
+        self.assertEqual(self.origin.hits, [])
+        with self.assertRaises(NonPublicAddress):
+            fetch(url, 5, 1024)
+
+    def test_redirects_to_private_hosts_are_refused(self):
+        # only the origin's own address counts as public here
+        with mock.patch.object(images, 'is_public', lambda ip: ip == '127.0.0.1'):
+            target = f'http://127.0.0.2:{self.origin.server_port}/pixel.png'
+            with self.assertRaises(NonPublicAddress):
+                fetch(f'{self.base}/redirect?{target}', 5, 1024)
+        self.assertEqual(self.origin.hits, [f'/redirect?{target}'])
+
+    def test_internal_addresses_are_not_public(self):
+        for ip in ('127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+                   '100.64.0.1', '0.0.0.0', '224.0.0.1', '::1', 'fe80::1%eth0', 'fc00::1',
+                   '::ffff:127.0.0.1'):
+            self.assertFalse(is_public(ip), ip)
+        for ip in ('93.184.216.34', '2606:2800:220:1:248:1893:25c8:1946'):
+            self.assertTrue(is_public(ip), ip)
+
+    def test_store_evicts_least_recently_used_blobs(self):
+        store = ImageStore(os.path.join(self.folder, 'bounded'), 1000)
+        for number in range(10):
+            store.put(f'url{number}', 'tile', os.urandom(300), 'jpg')
+            os.utime(store._blob_path(store.lookup(f'url{number}', 'tile')), (number, number))
+
+        kept = [number for number in range(10) if store.lookup(f'url{number}', 'tile')]
+        self.assertLessEqual(len(kept) * 300, 1000)
+        self.assertEqual(kept, list(range(10 - len(kept), 10)))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
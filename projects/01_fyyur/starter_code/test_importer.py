@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import bookings
+from app import app
+from config import db, engine_options
+from importer import ShowImporter, VenueImporter, read_rows, to_formdata
+from models import Venue, Artist, Show, seed_genres
+
+VENUE = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+         'phone': '123-123-1234', 'genres': 'Jazz, Folk', 'facebook_link': 'https://www.facebook.com/hop',
+         'seeking_talent': True}
+
+
+class ImporterTestCase(unittest.TestCase):
+    """This class represents the bulk importer test case"""
+
+    def setUp(self):
+        """Bind the app to an empty SQLite database with the genres, one venue and one artist."""
+        self.folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.folder, 'fyyur.db')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + self.database_path
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        seed_genres()
+        bookings.reset()
+        db.session.add(Venue(id=1, name='Venue', city='San Francisco', state='CA'))
+        db.session.add(Artist(id=1, name='Artist', city='San Francisco', state='CA'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Drop the database."""
+        db.session.remove()
+        db.drop_all()
+        bookings.reset()
+        self.context.pop()
+        shutil.rmtree(self.folder)
+
+    def load(self, importer_class, rows):
+        rejects = io.StringIO()
+        importer = importer_class(rejects)
+        with app.test_request_context():
+            importer.load(list(enumerate(rows, start=1)))
+        return importer, {reject['line']: reject['errors']
+                          for reject in map(json.loads, rejects.getvalue().splitlines())}
+
+    def test_rows_keep_their_line_numbers(self):
+        rows = list(read_rows(io.StringIO('{"name": "a"}\n\nnot json\n[1]\n'), 'ndjson'))
+        csv_rows = list(read_rows(io.StringIO('name,genres\na,"Jazz, Folk"\n'), 'csv'))
+
+        self.assertEqual(rows, [(1, {'name': 'a'}), (3, None), (4, None)])
+        self.assertEqual(csv_rows, [(2, {'name': 'a', 'genres': 'Jazz, Folk'})])
+        self.assertEqual(to_formdata(csv_rows[0][1]).getlist('genres'), ['Jazz', 'Folk'])
+        self.assertNotIn('seeking_talent', to_formdata({'seeking_talent': False}))
+
+    def test_invalid_rows_are_rejected_with_their_form_errors(self):
+        importer, rejected = self.load(VenueImporter, [
+            VENUE,
+            None,
+            dict(VENUE, state='ZZ', phone='nope'),
+            dict(VENUE, genres='Jazz, Bogus'),
+            dict(VENUE, name='The Dueling Pianos Bar'),
+        ])
+
+        self.assertEqual(sorted(rejected), [2, 3, 4])
+        self.assertEqual(rejected[2], {'row': ['not a JSON object']})
+        self.assertEqual(set(rejected[3]), {'state', 'phone'})
+        self.assertEqual(set(rejected[4]), {'genres'})
+        self.assertEqual((importer.inserted, importer.rejected), (2, 3))
+        hop = Venue.query.filter_by(name='The Musical Hop').one()
+        self.assertEqual((hop.genre_names, hop.seeking_talent), (['Folk', 'Jazz'], True))
+
+    def test_shows_need_existing_integer_ids(self):
+        importer, rejected = self.load(ShowImporter, [
+            {'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-01 20:00:00'},
+            {'artist_id': 'one', 'venue_id': 1, 'start_time': '2030-01-02 20:00:00'},
+            {'artist_id': 1, 'venue_id': 99, 'start_time': '2030-01-03 20:00:00'},
+            {'artist_id': 98, 'venue_id': 99, 'start_time': '2030-01-04 20:00:00'},
+            {'artist_id': 1, 'venue_id': 1, 'start_time': 'tomorrow'},
+        ])
+
+        self.assertEqual(sorted(rejected), [2, 3, 4, 5])
+        self.assertEqual(set(rejected[2]), {'artist_id', 'venue_id'})
+        self.assertEqual(rejected[3], {'venue_id': ['no such venue']})
+        self.assertEqual(rejected[4], {'artist_id': ['no such artist'], 'venue_id': ['no such venue']})
+        self.assertIn('start_time', rejected[5])
+        self.assertEqual((importer.inserted, Show.query.count()), (1, 1))
+
+    def test_command_writes_rejects_and_a_summary(self):
+        path = os.path.join(self.folder, 'venues.ndjson')
+        with open(path, 'w') as source:
+            source.write(json.dumps(VENUE) + '\ngarbage\n' + json.dumps(dict(VENUE, phone='x')) + '\n')
+        rejects = os.path.join(self.folder, 'rejects.ndjson')
+
+        result = app.test_cli_runner().invoke(
+            args=['import', 'venues', path, '--batch-size', '2', '--rejects', rejects])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('venues: 1 inserted, 2 rejected', result.output)
+        with open(rejects) as file:
+            self.assertEqual([json.loads(line)['line'] for line in file], [2, 3])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from werkzeug.exceptions import BadRequest
+
+from app import app
+from config import db, engine_options
+from models import Venue, Artist, Show
+from pagination import (DEFAULT_PER_PAGE, MAX_PER_PAGE, clamp_per_page, decode_cursor, encode_cursor,
+                        keyset_paginate, paginate_request)
+
+ARTIST_KEYS = (Artist.name, Artist.id)
+SHOW_KEYS = (Show.start_time, Show.id)
+
+
+def artist_key(artist):
+    return artist.name, artist.id
+
+
+def show_key(show):
+    return show.start_time, show.id
+
+
+class CursorTestCase(unittest.TestCase):
+    """This class represents the cursor encoding test case"""
+
+    def test_cursors_round_trip_typed_after_the_keys(self):
+        start = datetime(2030, 1, 1, 20, 30)
+
+        self.assertEqual(decode_cursor(encode_cursor(('Guns N Petals', 4)), ARTIST_KEYS), ('Guns N Petals', 4))
+        self.assertEqual(decode_cursor(encode_cursor((start, 7)), SHOW_KEYS), (start, 7))
+        self.assertNotIn('=', encode_cursor(('a', 1)))
+
+    def test_malformed_cursors_are_refused(self):
+        for cursor in ('!!!', encode_cursor(('a',)), encode_cursor({'a': 1})[:-2], 'bnVsbA'):
+            with self.assertRaises(ValueError, msg=cursor):
+                decode_cursor(cursor, ARTIST_KEYS)
+
+    def test_per_page_is_clamped(self):
+        self.assertEqual(clamp_per_page(None), DEFAULT_PER_PAGE)
+        self.assertEqual(clamp_per_page(0), DEFAULT_PER_PAGE)
+        self.assertEqual(clamp_per_page(-5), 1)
+        self.assertEqual(clamp_per_page(7), 7)
+        self.assertEqual(clamp_per_page(MAX_PER_PAGE * 10), MAX_PER_PAGE)
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    """This class represents the keyset pagination test case"""
+
+    def setUp(self):
+        """Bind the app to a SQLite database of seven artists, two sharing a name."""
+        self.folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.folder, 'fyyur.db')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + self.database_path
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        names = ['Ava', 'Bo', 'Cy', 'Cy', 'Di', 'Ed', 'Flo']
+        db.session.add_all(Artist(id=id, name=name) for id, name in enumerate(names, start=1))
+        db.session.commit()
+
+    def tearDown(self):
+        """Drop the database."""
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+        os.remove(self.database_path)
+        os.rmdir(self.folder)
+
+    def page(self, **kwargs):
+        return keyset_paginate(Artist.query, ARTIST_KEYS, artist_key, **kwargs)
+
+    def ids(self, page):
+        return [artist.id for artist in page]
+
+    def test_pages_forward_and_back(self):
+        first = self.page(per_page=3)
+        self.assertEqual(self.ids(first), [1, 2, 3])
+        self.assertIsNone(first.prev_cursor)
+
+        # equal names are ordered by id, so the cursor splits them exactly
+        second = self.page(after=first.next_cursor, per_page=3)
+        self.assertEqual(self.ids(second), [4, 5, 6])
+        self.assertIsNotNone(second.prev_cursor)
+
+        last = self.page(after=second.next_cursor, per_page=3)
+        self.assertEqual(self.ids(last), [7])
+        self.assertIsNone(last.next_cursor)
+
+        back = self.page(before=last.prev_cursor, per_page=3)
+        self.assertEqual(self.ids(back), [4, 5, 6])
+        self.assertEqual(back.next_cursor, second.next_cursor)
+
+        start = self.page(before=back.prev_cursor, per_page=3)
+        self.assertEqual(self.ids(start), [1, 2, 3])
+        self.assertIsNone(start.prev_cursor)
+        self.assertEqual(start.next_cursor, first.next_cursor)
+
+    def test_a_full_last_page_has_no_next_cursor(self):
+        page = self.page(per_page=7)
+
+        self.assertEqual(len(page.items), 7)
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.prev_cursor)
+
+    def test_pages_past_either_end_are_empty(self):
+        last = self.page(after=encode_cursor(('Flo', 7)))
+        before_first = self.page(before=encode_cursor(('Ava', 1)))
+
+        for page in (last, before_first):
+            self.assertEqual(page.items, [])
+            self.assertIsNone(page.next_cursor)
+            self.assertIsNone(page.prev_cursor)
+
+    def test_datetime_keys_seek_on_the_decoded_value(self):
+        db.session.add(Venue(id=1, name='Hop'))
+        start = datetime(2030, 1, 1, 20)
+        db.session.add_all(Show(id=id, venue_id=1, artist_id=id, start_time=start + timedelta(hours=id // 2 * 3))
+                           for id in range(1, 6))
+        db.session.commit()
+
+        first = keyset_paginate(Show.query, SHOW_KEYS, show_key, per_page=2)
+        second = keyset_paginate(Show.query, SHOW_KEYS, show_key, after=first.next_cursor, per_page=2)
+
+        self.assertEqual([show.id for show in first], [1, 2])
+        self.assertEqual([show.id for show in second], [3, 4])
+
+    def test_request_arguments_drive_the_page(self):
+        with app.test_request_context('/artists?per_page=1000'):
+            self.assertEqual(len(paginate_request(Artist.query, ARTIST_KEYS, artist_key).items), 7)
+        with app.test_request_context('/artists?per_page=2&after=' + encode_cursor(('Cy', 4))):
+            self.assertEqual(self.ids(paginate_request(Artist.query, ARTIST_KEYS, artist_key)), [5, 6])
+        with app.test_request_context('/artists?after=garbage'):
+            with self.assertRaises(BadRequest):
+                paginate_request(Artist.query, ARTIST_KEYS, artist_key)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
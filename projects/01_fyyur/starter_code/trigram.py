@@ -0,0 +1,85 @@
+import re
+import threading
+from collections import defaultdict
+
+_word = re.compile(r'\w+')
+
+
+def padded_trigrams(text):
+    """Trigrams as ``pg_trgm`` extracts them: per word, padded with blanks."""
+    grams = set()
+    for word in _word.findall(text.lower()):
+        word = f'  {word} '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def raw_trigrams(text):
+    """Every 3-character window of ``text``; a substring shares all of them."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(left, right):
+    left, right = padded_trigrams(left), padded_trigrams(right)
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class TrigramIndex:
+    """In-process stand-in for a ``gin_trgm_ops`` index on a name column.
+
+    Postings map each raw trigram to the keys whose name contains it, so a
+    substring search only verifies names that share every trigram of the
+    term instead of scanning the whole table.
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._postings = defaultdict(set)
+        for key, name in rows:
+            self.add(key, name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, name):
+        with self._lock:
+            self._discard(key)
+            if name is None:
+                return
+            self._names[key] = name
+            for gram in raw_trigrams(name):
+                self._postings[gram].add(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        name = self._names.pop(key, None)
+        if name is None:
+            return
+        for gram in raw_trigrams(name):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, term):
+        """Keys whose name contains ``term``, most similar first."""
+        needle = term.lower()
+        with self._lock:
+            grams = raw_trigrams(needle)
+            if grams:
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = set(self._names)
+            matches = [(key, self._names[key]) for key in candidates
+                       if needle in self._names[key].lower()]
+        matches.sort(key=lambda match: (-similarity(match[1], term), match[1].lower(), match[0]))
+        return [key for key, _ in matches]